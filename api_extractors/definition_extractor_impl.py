@@ -5,6 +5,12 @@ from typing import List, Dict, Set, Optional, Any, Tuple
 from collections import defaultdict
 from api_database_tools.api_extractors.tree_sitter_backend import parse_file, query
 
+# Name of the called function at the start of a call expression
+_CALL_NAME_RE = re.compile(r'([A-Za-z_][\w:]*)\s*\(')
+
+# Call-like keywords that are not function calls
+_CALL_KEYWORDS = frozenset({'if', 'while', 'for', 'switch', 'return', 'sizeof', 'delete', 'new'})
+
 class ASTNodeAnalyzer:
     """Analyzes AST nodes to extract semantic information."""
     
@@ -639,12 +645,12 @@ class UniversalAPIExtractor:
         text = node['text']
         
         # Extract function name from call
-        match = re.match(r'([A-Za-z_][\w:]*)\s*\(', text)
+        match = _CALL_NAME_RE.match(text)
         if match:
             func_name = match.group(1)
             
             # Skip common keywords
-            if func_name not in ['if', 'while', 'for', 'switch', 'return', 'sizeof', 'delete', 'new']:
+            if func_name not in _CALL_KEYWORDS:
                 # DON'T add calls to the functions list!
                 # Just track them separately if needed for usage analysis
                 pass  # Remove the lines that add to self.apis['functions']
@@ -794,7 +800,6 @@ class UniversalAPIExtractor:
         
         # Handle operator functions
         if "operator" in signature:
-            import re
             match = re.search(r'operator\s*[^\s(]+', signature)
             if match:
                 return match.group(0)
@@ -3,7 +3,7 @@ import subprocess
 import threading
 import uuid
 from pathlib import Path
-from typing import Dict, List, Tuple, Union, Optional, Any
+from typing import Dict, Iterator, List, Tuple, Union, Optional, Any
 
 try:
     import tree_sitter
@@ -24,6 +24,7 @@ _CPP_GRAMMAR_REPO = _THIS_DIR / "vendor" / "tree-sitter-cpp"
 _CPP_LANGUAGE: Optional[Language] = None
 _PARSER: Optional[Parser] = None
 _LOCK = threading.Lock()
+_PARSER_LOCK = threading.Lock()  # a Parser must not be used by two threads at once
 _TREES: Dict[str, Tuple[Any, bytes]] = {}
 
 
@@ -94,8 +95,6 @@ def parse_file(file_path: Union[str, Path]) -> str:
     Returns:
         tree_id: Unique identifier for the cached tree
     """
-    _initialize_parser()
-    
     # Resolve the file path
     p = Path(file_path)
     if not p.is_absolute():
@@ -119,8 +118,24 @@ def parse_file(file_path: Union[str, Path]) -> str:
         print(f"[WARNING] File not found: {p}")
         source = b""
     
-    # Parse the file
-    tree = _PARSER.parse(source)
+    return parse_bytes(source)
+
+
+def parse_bytes(source: bytes) -> str:
+    """
+    Parse in-memory source code and cache the syntax tree.
+    
+    Args:
+        source: C++ source code as UTF-8 bytes
+        
+    Returns:
+        tree_id: Unique identifier for the cached tree
+    """
+    _initialize_parser()
+    
+    # Parse the source
+    with _PARSER_LOCK:
+        tree = _PARSER.parse(source)
     tree_id = uuid.uuid4().hex
     
     # Cache the tree and source
@@ -130,6 +145,12 @@ def parse_file(file_path: Union[str, Path]) -> str:
     return tree_id
 
 
+def discard_tree(tree_id: str) -> None:
+    """Drop a cached tree that is no longer needed."""
+    with _LOCK:
+        _TREES.pop(tree_id, None)
+
+
 def has_errors(tree_id: str) -> bool:
     """Check if the cached tree contains syntax errors."""
     with _LOCK:
@@ -146,44 +167,43 @@ def has_errors(tree_id: str) -> bool:
     return check_errors(tree.root_node)
 
 
-def query(tree_id: str, query_str: str) -> List[Dict[str, Any]]:
+def iter_captures(tree_id: str, query_str: str) -> Iterator[Tuple[str, Any]]:
     """
-    Run a Tree-sitter query against the cached tree.
+    Run a Tree-sitter query and yield (capture_name, node) pairs lazily.
     
-    According to the documentation, query.captures() returns a dictionary
-    where keys are capture names and values are lists of nodes.
+    Unlike query(), no text is decoded and no result list is built, so
+    callers can keep only the captures they need.
     
     Args:
         tree_id: Identifier of the cached tree
         query_str: Tree-sitter query string
         
     Returns:
-        List of dictionaries with keys: name, text, byte_range
+        Iterator of (capture_name, node) tuples in the same order as query()
     """
+    # Validate here rather than in the generator, so errors surface at the call
     if tree_id not in _TREES:
         raise ValueError(f"Tree '{tree_id}' not loaded")
 
     with _LOCK:
-        tree, src = _TREES[tree_id]
+        tree, _ = _TREES[tree_id]
     
     # Create the query using the language from the parser
     q = _PARSER.language.query(query_str)
     
+    return _iter_captures(q, tree)
+
+
+def _iter_captures(q, tree) -> Iterator[Tuple[str, Any]]:
+    """Yield (capture_name, node) pairs of a compiled query run on a tree."""
     # Get captures - should return a dict
     captures_dict = q.captures(tree.root_node)
     
-    results = []
-    
     if isinstance(captures_dict, dict):
         # Modern API: dict of capture_name -> [nodes]
         for capture_name, nodes in captures_dict.items():
             for node in nodes:
-                snippet = src[node.start_byte:node.end_byte].decode("utf-8", "ignore")
-                results.append({
-                    "name": capture_name,
-                    "text": snippet,
-                    "byte_range": (node.start_byte, node.end_byte),
-                })
+                yield capture_name, node
     else:
         # Fallback for older API or unexpected format
         print(f"[WARNING] Unexpected captures format: {type(captures_dict)}")
@@ -194,14 +214,37 @@ def query(tree_id: str, query_str: str) -> List[Dict[str, Any]]:
                 if isinstance(item, tuple) and len(item) == 2:
                     # Old API: (node, capture_name) tuples
                     node, capture_name = item
-                    snippet = src[node.start_byte:node.end_byte].decode("utf-8", "ignore")
-                    results.append({
-                        "name": capture_name,
-                        "text": snippet,
-                        "byte_range": (node.start_byte, node.end_byte),
-                    })
+                    yield capture_name, node
         except Exception as e:
             print(f"[ERROR] Failed to process captures: {e}")
+
+
+def query(tree_id: str, query_str: str) -> List[Dict[str, Any]]:
+    """
+    Run a Tree-sitter query against the cached tree.
+    
+    According to the documentation, query.captures() returns a dictionary
+    where keys are capture names and values are lists of nodes.
+    
+    Args:
+        tree_id: Identifier of the cached tree
+        query_str: Tree-sitter query string
+        
+    Returns:
+        List of dictionaries with keys: name, text, byte_range
+    """
+    if tree_id not in _TREES:
+        raise ValueError(f"Tree '{tree_id}' not loaded")
+    src = get_tree_source(tree_id)
+    
+    results = []
+    for capture_name, node in iter_captures(tree_id, query_str):
+        snippet = src[node.start_byte:node.end_byte].decode("utf-8", "ignore")
+        results.append({
+            "name": capture_name,
+            "text": snippet,
+            "byte_range": (node.start_byte, node.end_byte),
+        })
     
     return results
 
@@ -246,6 +289,15 @@ def get_tree_content(tree_id: str) -> str:
         return src.decode('utf-8', 'ignore')
 
 
+def get_tree_source(tree_id: str) -> bytes:
+    """Get the raw source bytes for a given tree_id, as addressed by node byte offsets."""
+    with _LOCK:
+        tree, src = _TREES.get(tree_id, (None, None))
+        if src is None:
+            raise KeyError(f"Tree ID '{tree_id}' not found in cache")
+        return src
+
+
 # ---------------------------------------------------------------------------
 # Helper functions
 # ---------------------------------------------------------------------------
@@ -1,9 +1,12 @@
 import os
+import re
 import json
 import time
 from pathlib import Path
-from typing import Dict, List, Set, Optional
+from typing import Dict, List, Set, Optional, Tuple
 from collections import defaultdict
+from dataclasses import dataclass
+from bisect import bisect_right
 import hashlib
 
 import sys
@@ -13,7 +16,7 @@ from api_extractors.definition_extractor import (
     extract_apis_from_header,
     extract_member_functions
 )
-from api_extractors.tree_sitter_backend import parse_file, query
+from api_extractors.tree_sitter_backend import parse_file, query, iter_captures, get_tree_source
 
 class APISignatureDatabase:
     """Database containing full API signatures for validation."""
@@ -133,26 +136,24 @@ class APISignatureDatabase:
                 
                 # Process functions
                 try:
-                    func_declarations = extract_function_declarations(str(file_path))
-                    for func_data in func_declarations:
-                        if 'name' in func_data:
-                            # Build signature from components
-                            signature = f"{func_data.get('return_type', 'void')} {func_data['name']}{func_data.get('parameters', '()')}"
-                            
-                            api_entry = {
-                                "name": func_data['name'],
-                                "type": "function" if not func_data.get('is_template') else "template_function",
-                                "signature": signature,
-                                "header": include_path,
-                                "key": f"function::{func_data['name']}",
-                                "parameters": func_data.get('parameters', '()'),
-                                "param_types": func_data.get('param_types', []),
-                                "return_type": func_data.get('return_type', 'void'),
-                                "is_template": func_data.get('is_template', False)
-                            }
-                            
-                            if self._store_api(api_entry):
-                                header_apis.append(api_entry["key"])
+                    batch = extract_function_declarations(str(file_path))
+                    for name, return_type, parameters, param_types, is_template, signature in zip(
+                            batch.names, batch.return_types, batch.parameters,
+                            batch.param_types, batch.is_template, batch.signatures):
+                        api_entry = {
+                            "name": name,
+                            "type": "function" if not is_template else "template_function",
+                            "signature": signature,
+                            "header": include_path,
+                            "key": f"function::{name}",
+                            "parameters": parameters,
+                            "param_types": param_types,
+                            "return_type": return_type,
+                            "is_template": bool(is_template)
+                        }
+                        
+                        if self._store_api(api_entry):
+                            header_apis.append(api_entry["key"])
                 except Exception as e:
                     print(f"  Tree-sitter extraction failed: {e}")
                 # Process function signatures from the main API extraction
@@ -694,7 +695,118 @@ class APISignatureDatabase:
                         f.write(f"    Signature: {ex['signature']}\n")
                     f.write(f"    Header: {ex['header']}\n")
 
-def extract_function_declarations(file_path: str) -> List[Dict]:
+@dataclass
+class FunctionsBatch:
+    """
+    Function declarations from one file, stored column-wise.
+    
+    Each list holds one field for every function, so the i-th entry of every
+    column describes the same declaration. The is_template flags are packed
+    one byte per function in a bytearray rather than a list of bool objects.
+    """
+    __slots__ = ('names', 'return_types', 'parameters', 'param_types', 'is_template', 'signatures')
+    
+    names: List[str]
+    return_types: List[str]
+    parameters: List[str]
+    param_types: List[List[str]]
+    is_template: bytearray
+    signatures: List[str]
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def __iter__(self):
+        """Yield one dict per function, for callers that want records."""
+        for name, return_type, parameters, param_types, is_template, signature in zip(
+                self.names, self.return_types, self.parameters,
+                self.param_types, self.is_template, self.signatures):
+            yield {
+                'name': name,
+                'return_type': return_type,
+                'parameters': parameters,
+                'param_types': param_types,
+                'is_template': bool(is_template),
+                'signature': signature
+            }
+
+class FileContext:
+    """
+    Per-file state for extract_function_declarations.
+    
+    Built once per parsed file so the call index is not rebuilt for every
+    declaration that is checked against it.
+    """
+    __slots__ = ('tree_id', 'calls_iv')
+    
+    def __init__(self, tree_id: str):
+        self.tree_id = tree_id
+        self.calls_iv = build_call_index(tree_id)
+    
+    def is_inside_call(self, node_range: tuple) -> bool:
+        """Check if a node is inside a call_expression of this file."""
+        return is_inside_call_expression(self.tree_id, node_range, self.calls_iv)
+
+# Capture names of the whole declaration nodes in extract_function_declarations
+_DECL_NODE_CAPTURES = frozenset({
+    'declaration_node', 'definition_node', 'member_declaration',
+    'template_decl_node', 'template_def_node'
+})
+
+# Component capture prefix -> capture name of the declaration it belongs to
+_COMPONENT_OWNER_KINDS = {
+    'decl': 'declaration_node',
+    'def': 'definition_node',
+    'member': 'member_declaration',
+    'template_decl': 'template_decl_node',
+    'template_def': 'template_def_node',
+}
+
+# Component capture suffix -> func_info field
+_COMPONENT_FIELDS = {'type': 'return_type', 'name': 'name', 'params': 'parameters'}
+
+def _group_components(decls: List[Tuple[str, tuple]],
+                      components: List[Tuple[str, int, int]]) -> Dict[tuple, Dict[str, tuple]]:
+    """
+    Group component byte ranges under the declaration that owns them.
+    
+    Each component goes to the innermost enclosing declaration of its own kind,
+    found with one sweep over declarations and components sorted by start byte
+    (one stack of open declarations per kind). Fields are then filled in capture
+    order, so the last component of each kind wins.
+    
+    Returns:
+        Mapping of declaration byte range -> {field: (start, end)}
+    """
+    sorted_decls = sorted(decls, key=lambda decl: (decl[1][0], -decl[1][1]))
+    open_decls = defaultdict(list)
+    owners = {}
+    next_decl = 0
+    
+    for index in sorted(range(len(components)), key=lambda i: components[i][1]):
+        comp_name, comp_start, comp_end = components[index]
+        
+        # Open every declaration starting at or before this component
+        while next_decl < len(sorted_decls) and sorted_decls[next_decl][1][0] <= comp_start:
+            kind, decl_range = sorted_decls[next_decl]
+            open_decls[kind].append(decl_range)
+            next_decl += 1
+        
+        # Syntax nodes nest, so declarations that end too early are closed for good
+        stack = open_decls[_COMPONENT_OWNER_KINDS[comp_name.rsplit('_', 1)[0]]]
+        while stack and stack[-1][1] < comp_end:
+            stack.pop()
+        if stack:
+            owners[index] = stack[-1]
+    
+    grouped = defaultdict(dict)
+    for index, (comp_name, comp_start, comp_end) in enumerate(components):
+        decl_range = owners.get(index)
+        if decl_range is not None:
+            grouped[decl_range][_COMPONENT_FIELDS[comp_name.rsplit('_', 1)[1]]] = (comp_start, comp_end)
+    return grouped
+
+def extract_function_declarations(file_path: str) -> FunctionsBatch:
     """Extract ONLY function declarations, not usage."""
     
     tree_id = parse_file(file_path)
@@ -753,88 +865,113 @@ def extract_function_declarations(file_path: str) -> List[Dict]:
     ]
     """
     
-    results = query(tree_id, declaration_only_query)
+    # Per-file context: the call index is built exactly once
+    ctx = FileContext(tree_id)
+    source = get_tree_source(tree_id)
+    
+    # Stream the captures: keep declaration ranges and component positions
+    # only, and decode component text just for the components that are used
+    decls = []
+    components = []
+    for capture_name, node in iter_captures(tree_id, declaration_only_query):
+        if capture_name in _DECL_NODE_CAPTURES:
+            decls.append((capture_name, (node.start_byte, node.end_byte)))
+        else:
+            components.append((capture_name, node.start_byte, node.end_byte))
+    components_by_decl = _group_components(decls, components)
     
-    # Process results
-    functions = []
+    # Process declarations into parallel columns
+    names = []
+    return_types = []
+    parameters = []
+    param_types = []
+    is_template = bytearray()
+    signatures = []
     seen_nodes = set()
     
-    for result in results:
+    for node_type, decl_range in decls:
         # Skip if we've seen this byte range
-        if result['byte_range'] in seen_nodes:
+        if decl_range in seen_nodes:
             continue
-            
-        node_type = result['name']
+        seen_nodes.add(decl_range)
         
-        # Only process the main declaration nodes
-        if node_type in ['declaration_node', 'definition_node', 'member_declaration', 'template_decl_node', 'template_def_node']:
-            seen_nodes.add(result['byte_range'])
-            
-            # Collect components for this declaration
-            func_info = {
-                'range': result['byte_range'],
-                'is_template': 'template' in node_type
-            }
-            
-            # Find associated components
-            for component in results:
-                # Must be within the declaration's range
-                if (component['byte_range'][0] >= func_info['range'][0] and
-                    component['byte_range'][1] <= func_info['range'][1]):
-                    
-                    comp_name = component['name']
-                    if comp_name.endswith('_type'):
-                        func_info['return_type'] = component['text']
-                    elif comp_name.endswith('_name'):
-                        func_info['name'] = component['text']
-                    elif comp_name.endswith('_params'):
-                        func_info['parameters'] = component['text']
-            
-            # Verify this is NOT inside a call_expression
-            if not is_inside_call_expression(tree_id, func_info['range']):
-                if 'name' in func_info and 'parameters' in func_info:
-                    # Additional check: skip if this looks like a macro call
-                    # Macros are typically all uppercase or have uppercase naming
-                    func_name = func_info.get('name', '')
-                    
-                    # Skip if it's a likely macro (all uppercase)
-                    if func_name.isupper() or (func_name and 
-                        all(c.isupper() or c == '_' or c.isdigit() for c in func_name)):
+        # Collect components for this declaration
+        func_info = {
+            'range': decl_range,
+            'is_template': 'template' in node_type
+        }
+        
+        # Components of this declaration (the last one of each kind wins)
+        component_ranges = components_by_decl.get(decl_range, {})
+        for key, (comp_start, comp_end) in component_ranges.items():
+            func_info[key] = source[comp_start:comp_end].decode("utf-8", "ignore")
+        
+        # Verify this is NOT inside a call_expression
+        if not ctx.is_inside_call(func_info['range']):
+            if 'name' in func_info and 'parameters' in func_info:
+                # Additional check: skip if this looks like a macro call
+                # Macros are typically all uppercase or have uppercase naming
+                func_name = func_info['name']
+                
+                # Skip if it's a likely macro (all uppercase)
+                if func_name.isupper() or (func_name and 
+                    all(c.isupper() or c == '_' or c.isdigit() for c in func_name)):
+                    continue
+                
+                # Skip if there's no return type (likely a macro or call)
+                if not func_info.get('return_type'):
+                    # Unless it's a constructor/destructor
+                    if not (func_name.startswith('~') or 
+                            (func_info['is_template'] and '::' in func_name)):
                         continue
-                    
-                    # Skip if there's no return type (likely a macro or call)
-                    if not func_info.get('return_type'):
-                        # Unless it's a constructor/destructor
-                        if not (func_name.startswith('~') or 
-                                (func_info.get('is_template', False) and '::' in func_name)):
-                            continue
-                    
-                    functions.append({
-                        'name': func_info.get('name'),
-                        'return_type': func_info.get('return_type', 'void'),
-                        'parameters': func_info.get('parameters', '()'),
-                        'param_types': extract_parameter_types_from_text(func_info.get('parameters', '()')),
-                        'is_template': func_info.get('is_template', False),
-                        'signature': f"{func_info.get('return_type', 'void')} {func_info.get('name')}{func_info.get('parameters', '()')}"
-                    })
-    
-    return functions
+                
+                # Read each field once; name and parameters are known to be present
+                return_type = func_info.get('return_type', 'void')
+                params = func_info['parameters']
+                
+                names.append(func_name)
+                return_types.append(return_type)
+                parameters.append(params)
+                param_types.append(extract_parameter_types_from_text(params))
+                is_template.append(func_info['is_template'])
+                signatures.append(''.join((return_type, ' ', func_name, params)))
 
-def is_inside_call_expression(tree_id: str, node_range: tuple) -> bool:
-    """Check if a node is inside a call_expression."""    
-    # Find all call expressions
+    return FunctionsBatch(names, return_types, parameters, param_types, is_template, signatures)
+
+def build_call_index(tree_id: str) -> Tuple[List[int], List[int]]:
+    """
+    Build a containment index over all call_expression ranges in a tree.
+    
+    Returns the call start bytes in sorted order together with the running
+    maximum of their end bytes, so a containment check is a single bisect.
+    """
     call_query = "(call_expression) @call"
-    call_results = query(tree_id, call_query)
+    # Only the byte ranges are needed, so no node text is decoded
+    call_ranges = sorted((node.start_byte, node.end_byte) for _, node in iter_captures(tree_id, call_query))
     
-    # Check if our node is inside any call expression
-    node_start, node_end = node_range
-    for call in call_results:
-        call_start, call_end = call['byte_range']
-        # If our node is inside this call expression
-        if call_start <= node_start and node_end <= call_end:
-            return True
+    starts = []
+    max_ends = []
+    max_end = -1
+    for call_start, call_end in call_ranges:
+        max_end = max(max_end, call_end)
+        starts.append(call_start)
+        max_ends.append(max_end)
+    
+    return starts, max_ends
+
+def is_inside_call_expression(tree_id: str, node_range: tuple,
+                              call_index: Optional[Tuple[List[int], List[int]]] = None) -> bool:
+    """Check if a node is inside a call_expression."""
+    # Build the index on demand when the caller did not pass one in
+    if call_index is None:
+        call_index = build_call_index(tree_id)
+    starts, max_ends = call_index
     
-    return False
+    # Among the calls starting at or before our node, the one reaching
+    # furthest decides whether the node is enclosed
+    node_start, node_end = node_range
+    i = bisect_right(starts, node_start)
+    return i > 0 and max_ends[i - 1] >= node_end
 
 def extract_parameter_types_from_ast(tree_id: str, params_node: Dict) -> List[str]:
     """Extract parameter types from a parameter list node."""    
@@ -914,10 +1051,15 @@ def extract_parameter_types_from_list(tree_id: str, param_text: str, parent_rang
     
     return param_types
 
+# Parameter lists that have no parameter types, checked before any string work
+_EMPTY_PARAM_LISTS = frozenset({'', '()', '(void)', '( )'})
+
 def extract_parameter_types_from_text(param_text: str) -> List[str]:
     """Extract parameter types from parameter list text"""
-    if not param_text or param_text == '()':
+    if param_text in _EMPTY_PARAM_LISTS:
         return []
+    if param_text == '(...)':
+        return ['...']
     
     # Remove outer parentheses
     param_text = param_text.strip('()')
@@ -961,6 +1103,34 @@ def extract_parameter_types_from_text(param_text: str) -> List[str]:
     
     return param_types
 
+# Characters that open/close a nesting level or separate words in a parameter
+_WORD_DELIMS_RE = re.compile(r'[<(\[>)\] \t]')
+
+def _scan_words(param: str) -> List[Tuple[int, int]]:
+    """Return (start, end) offsets of the top-level words in a parameter.
+    
+    Words are separated by spaces/tabs outside any <>, () or [] nesting. Only
+    the delimiter characters are visited, so ordinary identifier characters
+    are skipped by the regex engine instead of a Python loop.
+    """
+    spans = []
+    depth = 0
+    start = 0
+    for match in _WORD_DELIMS_RE.finditer(param):
+        char = match.group()
+        if char in '<([':
+            depth += 1
+        elif char in '>)]':
+            depth -= 1
+        elif depth == 0:
+            pos = match.start()
+            if pos > start:
+                spans.append((start, pos))
+            start = pos + 1
+    if len(param) > start:
+        spans.append((start, len(param)))
+    return spans
+
 def extract_type_from_parameter(param: str) -> str:
     """Extract type from a parameter declaration."""
     param = param.strip()
@@ -982,26 +1152,7 @@ def extract_type_from_parameter(param: str) -> str:
         return param  # Return full function pointer type
     
     # Split into words, handling templates and qualified names
-    words = []
-    current_word = []
-    depth = 0
-    
-    for char in param:
-        if char in '<([':
-            depth += 1
-            current_word.append(char)
-        elif char in '>)]':
-            depth -= 1
-            current_word.append(char)
-        elif char in ' \t' and depth == 0:
-            if current_word:
-                words.append(''.join(current_word))
-                current_word = []
-        else:
-            current_word.append(char)
-    
-    if current_word:
-        words.append(''.join(current_word))
+    words = [param[start:end] for start, end in _scan_words(param)]
     
     if not words:
         return param
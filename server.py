@@ -5,16 +5,18 @@ A wrapper server that can selectively disable specific MCP tool functions.
 """
 
 import asyncio
+import copy
+import functools
+import importlib
 import json
 import logging
 import sys
 import os
-from typing import List, Optional, Set
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from fastmcp import FastMCP
-from tools.get_decomposed_function import decompose_function
-from tools.get_llk_functions import query_llk_functions
-from tools.get_similar_symbols import find_similar_symbols
 
 # Configure logging
 logging.basicConfig(
@@ -23,6 +25,66 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Tool implementations are CPU-bound; run them off the event loop so calls can overlap
+_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tt-metal-tool")
+
+
+async def _run_in_pool(func, **kwargs):
+    """Run a synchronous tool implementation in the worker pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_POOL, functools.partial(func, **kwargs))
+
+# Tool implementations, imported on first call so server startup only pays for fastmcp
+_TOOL_IMPLS: Dict[str, Any] = {}
+
+
+def _tool_impl(module_name: str, func_name: str):
+    """Import a tool implementation the first time it is needed and reuse it afterwards."""
+    impl = _TOOL_IMPLS.get(func_name)
+    if impl is None:
+        impl = getattr(importlib.import_module(module_name), func_name)
+        _TOOL_IMPLS[func_name] = impl
+    return impl
+
+# Results of earlier tool calls, keyed by tool name and arguments (least recently used first).
+# Only touched from the event loop thread, so no lock is needed.
+_RESULT_CACHE_SIZE = 512
+_RESULT_CACHE: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+
+# Databases the tools read; their mtimes are part of the cache keys, so a rebuilt
+# database invalidates earlier results
+_TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tools")
+_API_IMPL_DB = os.path.join(_TOOLS_DIR, "api_impl_db.json")
+_API_SIGNATURES_DB = os.path.join(_TOOLS_DIR, "api_signatures_db.json")
+
+
+def _file_mtime_ns(file_path: str) -> Optional[int]:
+    """Modification time of a file, or None if it cannot be read, for cache keys."""
+    try:
+        return os.stat(file_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+async def _run_cached(key: Tuple, func, **kwargs) -> Dict[str, Any]:
+    """
+    Run a tool implementation, reusing the result of an identical earlier call.
+    
+    Callers get their own copy of the result, so mutating it cannot corrupt the
+    cache. Error results are not cached.
+    """
+    cached = _RESULT_CACHE.get(key)
+    if cached is not None:
+        _RESULT_CACHE.move_to_end(key)
+        return copy.deepcopy(cached)
+    
+    result = await _run_in_pool(func, **kwargs)
+    if "error" not in result:
+        _RESULT_CACHE[key] = copy.deepcopy(result)
+        if len(_RESULT_CACHE) > _RESULT_CACHE_SIZE:
+            _RESULT_CACHE.popitem(last=False)
+    return result
+
 class ConfigurableTTMetalMCPServer:
     """MCP server that can selectively disable specific tool functions."""
     
@@ -32,7 +94,13 @@ class ConfigurableTTMetalMCPServer:
         self._register_tools()
     
     def _register_tools(self):
-        """Register tools based on what's not disabled."""
+        """Register tools based on what's not disabled.
+        
+        Tool modules are imported on a tool's first call, so tools that are
+        disabled or never called cost nothing at startup. Each tool runs its synchronous
+        implementation in the worker pool so it does not block the event loop,
+        and repeated calls with the same arguments are answered from a cache.
+        """
         
         # Tool: decompose_function
         if "decompose_function" not in self.disabled_functions:
@@ -41,9 +109,14 @@ class ConfigurableTTMetalMCPServer:
                 description="Returns a complete implementation of every API function called in a given function and file, searched recursively to maximum depth. Use this to understand how a function works behind the scenes. Doesn't work for functions that are not defined in the TT-Metal API database."
             )
             async def decompose_function_tool(file_path: str, function_name: str) -> dict:
-                logger.info(f"🛠️  Called decompose_function with file_path={file_path}, function_name={function_name}")
-                result = await decompose_function(file_path=file_path, function_name=function_name)
-                logger.info(f"✅ decompose_function result: {len(result.get('dependencies', []))} dependencies found")
+                logger.info("Called decompose_function with file_path=%s, function_name=%s", file_path, function_name)
+                # Key on the file's and database's mtimes so edits to either invalidate the entry
+                key = ("decompose_function", file_path, _file_mtime_ns(file_path), function_name,
+                       _file_mtime_ns(_API_IMPL_DB))
+                impl = _tool_impl("tools.get_decomposed_function", "decompose_function_sync")
+                result = await _run_cached(key, impl, file_path=file_path, function_name=function_name)
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("decompose_function returned %d characters of code", len(result.get('decomposed_code', '')))
                 return result
         else:
             logger.info("decompose_function tool disabled")
@@ -55,9 +128,12 @@ class ConfigurableTTMetalMCPServer:
                 description="Returns validated names and signatures of LLK API calls similar to the query. Includes all functions from this file: tt_metal/hw/ckernels/wormhole_b0/metal/llk_api"
             )
             async def query_llk_functions_tool(keyword: str) -> dict:
-                logger.info(f"🛠️  Called query_llk_functions with keyword={keyword}")
-                result = await query_llk_functions(keyword=keyword)
-                logger.info(f"✅ query_llk_functions result count: {len(result.get('functions', []))} functions found")
+                logger.info("Called query_llk_functions with keyword=%s", keyword)
+                impl = _tool_impl("tools.get_llk_functions", "query_llk_functions_sync")
+                key = ("query_llk_functions", keyword, _file_mtime_ns(_API_SIGNATURES_DB))
+                result = await _run_cached(key, impl, keyword=keyword)
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("query_llk_functions found %d headers", len(result.get('headers', [])))
                 return result
         else:
             logger.info("query_llk_functions tool disabled")
@@ -69,9 +145,13 @@ class ConfigurableTTMetalMCPServer:
                 description="Find symbols similar to an incorrect symbol name, returns validated names and signatures similar to the query."
             )
             async def find_similar_symbols_tool(symbol: str, max_results: int = 10, search_paths: Optional[List[str]] = None) -> dict:
-                logger.info(f"🛠️  Called find_similar_symbols with symbol={symbol}, max_results={max_results}")
-                result = await find_similar_symbols(incorrect_symbol=symbol, max_results=max_results, search_paths=search_paths)
-                logger.info(f"✅ find_similar_symbols returned {len(result.get('results', []))} suggestions")
+                logger.info("Called find_similar_symbols with symbol=%s, max_results=%s", symbol, max_results)
+                paths_key = tuple(sorted(search_paths)) if search_paths else None
+                key = ("find_similar_symbols", symbol, max_results, paths_key, _file_mtime_ns(_API_SIGNATURES_DB))
+                impl = _tool_impl("tools.get_similar_symbols", "find_similar_symbols_sync")
+                result = await _run_cached(key, impl, incorrect_symbol=symbol, max_results=max_results, search_paths=search_paths)
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("find_similar_symbols returned %d suggestions", len(result.get('results', [])))
                 return result
         else:
             logger.info("find_similar_symbols tool disabled")
@@ -88,15 +168,15 @@ def main():
     disabled_env = os.environ.get('DISABLED_FUNCTIONS', '')
     if disabled_env:
         disabled_functions = set(disabled_env.split(','))
-        logger.info(f"Disabled functions from environment: {disabled_functions}")
+        logger.info("Disabled functions from environment: %s", disabled_functions)
     
     # Check for disabled functions from command line args
     if len(sys.argv) > 1:
         disabled_functions.update(sys.argv[1:])
-        logger.info(f"Disabled functions from command line: {set(sys.argv[1:])}")
+        logger.info("Disabled functions from command line: %s", set(sys.argv[1:]))
     
     if disabled_functions:
-        logger.info(f"Starting configurable TT-Metal MCP server with disabled functions: {disabled_functions}")
+        logger.info("Starting configurable TT-Metal MCP server with disabled functions: %s", disabled_functions)
     else:
         logger.info("Starting TT-Metal MCP server with all functions enabled")
     
@@ -3,8 +3,14 @@
 Pytest configuration for api_database_tools tests.
 """
 
+from pathlib import Path
+
 import pytest
 
+project_root = Path(__file__).parent.parent
+API_IMPL_DB = project_root / "tools" / "api_impl_db.json"
+API_SIG_DB = project_root / "tools" / "api_signatures_db.json"
+
 
 def pytest_addoption(parser):
     """Add custom pytest command line option."""
@@ -19,4 +25,41 @@ def pytest_addoption(parser):
 @pytest.fixture
 def display_results(request):
     """Fixture to check if results should be displayed."""
-    return request.config.getoption("--display-results")
\ No newline at end of file
+    return request.config.getoption("--display-results")
+
+
+@pytest.fixture(scope="session")
+def decomposer():
+    """FunctionDecomposer shared by the whole session, or None if the database is missing."""
+    if not API_IMPL_DB.exists():
+        return None
+    from tools.get_decomposed_function import FunctionDecomposer
+    return FunctionDecomposer(str(API_IMPL_DB))
+
+
+@pytest.fixture(scope="session")
+def llk_query():
+    """LLKFunctionQuery shared by the whole session, or None if the database is missing."""
+    if not API_SIG_DB.exists():
+        return None
+    from tools.get_llk_functions import LLKFunctionQuery
+    return LLKFunctionQuery()
+
+
+@pytest.fixture(scope="session")
+def symbol_finder():
+    """SymbolFinder shared by the whole session, or None if the database is missing."""
+    if not API_SIG_DB.exists():
+        return None
+    from tools.get_similar_symbols import SymbolFinder
+    return SymbolFinder(debug=False)
+
+
+@pytest.fixture(scope="session")
+async def mcp_client():
+    """In-process FastMCP client connected to one server for the whole session."""
+    fastmcp = pytest.importorskip("fastmcp")
+    from server import ConfigurableTTMetalMCPServer
+    
+    async with fastmcp.Client(ConfigurableTTMetalMCPServer().mcp) as client:
+        yield client
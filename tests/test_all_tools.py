@@ -2,7 +2,8 @@
 """
 Comprehensive test suite for the three MCP tools in api_database_tools.
 
-Tests both subprocess execution (command line interface) and MCP integration
+Tests the command line interface with a subprocess smoke test, the MCP server
+through an in-process FastMCP client, direct tool calls, and MCP integration
 using the Claude Code SDK programmatically.
 """
 
@@ -13,8 +14,15 @@ import sys
 import os
 import asyncio
 import argparse
+import functools
+import random
 from pathlib import Path
-from unittest.mock import patch, MagicMock
+from types import SimpleNamespace
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Add the project root to the Python path
 project_root = Path(__file__).parent.parent
@@ -23,12 +31,35 @@ sys.path.insert(0, str(project_root))
 # Change to project root for correct relative imports
 os.chdir(project_root)
 
-from tools.get_decomposed_function import decompose_function, FunctionDecomposer
-from tools.get_llk_functions import query_llk_functions, LLKFunctionQuery
-from tools.get_similar_symbols import find_similar_symbols, SymbolFinder
+# Paths used throughout the tests, computed once
+TOOLS_DIR = project_root / "tools"
+DECOMPOSE_SCRIPT = str(TOOLS_DIR / "get_decomposed_function.py")
+LLK_SCRIPT = str(TOOLS_DIR / "get_llk_functions.py")
+SIMILAR_SCRIPT = str(TOOLS_DIR / "get_similar_symbols.py")
+API_IMPL_DB = str(TOOLS_DIR / "api_impl_db.json")
+API_SIG_DB = str(TOOLS_DIR / "api_signatures_db.json")
+TEST_CPP = str(project_root / "tests" / "decomp_test_target.cpp")
+
+from tools.get_decomposed_function import decompose_function, decompose_function_sync, FunctionDecomposer, FunctionInfo
+from tools.get_llk_functions import query_llk_functions, query_llk_functions_sync, LLKFunctionQuery
+from tools.get_similar_symbols import find_similar_symbols, find_similar_symbols_sync, SymbolFinder
+from api_extractors.tree_sitter_backend import parse_bytes, query, iter_captures, discard_tree
+from db_generation.build_api_signature_db import build_call_index, is_inside_call_expression, _scan_words, _group_components
+
 
+def json_loads(text: str):
+    """Parse JSON with orjson when available, falling back to the stdlib."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
 
 
+def json_dumps_pretty(data) -> str:
+    """Pretty-print JSON with orjson when available, falling back to the stdlib."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
 
 def display_tool_output(tool_name: str, input_args: dict, output: dict, should_display: bool):
     """Display tool output in a format that shows what the model would see."""
@@ -42,82 +73,83 @@ def display_tool_output(tool_name: str, input_args: dict, output: dict, should_d
     for key, value in input_args.items():
         print(f"  {key}: {value}")
     print(f"\nMODEL WOULD SEE:")
-    print(json.dumps(output, indent=2, ensure_ascii=False))
+    print(json_dumps_pretty(output))
     print(f"{'='*60}\n")
 
 
 class TestSubprocessMode:
     """Test tools as subprocess with command line arguments."""
     
-    def setup_method(self):
-        """Setup for each test method."""
-        self.tools_dir = project_root / "tools"
-        self.test_cpp_file = project_root / "tests" / "decomp_test_target.cpp"
-        
-    def test_get_decomposed_function_subprocess(self):
-        """Test get_decomposed_function.py as subprocess."""
-        cmd = [
-            sys.executable, 
-            str(self.tools_dir / "get_decomposed_function.py"),
-            "--file", str(self.test_cpp_file),
+    @staticmethod
+    async def _read_last_line(stream) -> str:
+        """Read a stream to the end, keeping only its last non-empty line."""
+        last = b""
+        pending = b""
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            for line in reversed(lines):
+                if line.strip():
+                    last = line
+                    break
+        if pending.strip():
+            last = pending
+        return last.decode().strip()
+    
+    async def _run_tool(self, *args: str, timeout: float = 30):
+        """Run a tool script as a subprocess and return (returncode, last stdout line, stderr)."""
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            # Stream stdout instead of buffering it; drain stderr alongside so neither pipe fills
+            last_line, stderr = await asyncio.wait_for(
+                asyncio.gather(self._read_last_line(proc.stdout), proc.stderr.read()),
+                timeout
+            )
+            await proc.wait()
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        return proc.returncode, last_line, stderr.decode()
+    
+    async def _check_decomposed_function(self):
+        """Check get_decomposed_function.py as subprocess."""
+        returncode, last_line, stderr = await self._run_tool(
+            DECOMPOSE_SCRIPT,
+            "--file", TEST_CPP,
             "--function", "test_function"
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        )
         
         # Should complete without error (even if function not found)
-        assert result.returncode == 0, f"Command failed with stderr: {result.stderr}"
+        assert returncode == 0, f"Command failed with stderr: {stderr}"
         
         # Output should contain structured data (may not be pure JSON)
-        assert result.stdout.strip(), "No output received"
+        assert last_line, "No output received"
         
         # Try to parse as JSON, but don't fail if it's not pure JSON
-        lines = result.stdout.strip().split('\n')
-        last_line = lines[-1] if lines else ""
         if last_line.startswith('{') and last_line.endswith('}'):
             try:
-                output_data = json.loads(last_line)
+                output_data = json_loads(last_line)
                 assert isinstance(output_data, dict)
-            except json.JSONDecodeError:
+            except json.JSONDecodeError:  # orjson's error subclasses this
                 # Not JSON, but that's okay - just check it has content
                 pass
     
-    def test_get_llk_functions_subprocess(self):
-        """Test get_llk_functions.py as subprocess."""
-        cmd = [
-            sys.executable,
-            str(self.tools_dir / "get_llk_functions.py"),
-            "math"  # Search for math-related functions
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        # Should complete without error
-        assert result.returncode == 0, f"Command failed with stderr: {result.stderr}"
-        
-        # Output should contain structured data
-        assert result.stdout.strip(), "No output received"
-    
-    def test_get_similar_symbols_subprocess(self):
-        """Test get_similar_symbols.py as subprocess."""
-        cmd = [
-            sys.executable,
-            str(self.tools_dir / "get_similar_symbols.py"),
-            "add",  # Search for add-related symbols
-            "--max", "5"
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        # Should complete without error
-        assert result.returncode == 0, f"Command failed with stderr: {result.stderr}"
-        
-        # Output should contain structured data
-        assert result.stdout.strip(), "No output received"
+    @pytest.mark.asyncio
+    async def test_cli_subprocess_smoke(self):
+        """Smoke-test one tool script end to end through its command line interface."""
+        await self._check_decomposed_function()
     
     def test_get_decomposed_function_missing_args(self):
         """Test get_decomposed_function.py with missing arguments."""
-        cmd = [sys.executable, str(self.tools_dir / "get_decomposed_function.py")]
+        cmd = [sys.executable, DECOMPOSE_SCRIPT]
         
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
         
@@ -127,16 +159,37 @@ class TestSubprocessMode:
     
     def test_get_llk_functions_missing_args(self):
         """Test get_llk_functions.py with missing arguments."""
-        cmd = [sys.executable, str(self.tools_dir / "get_llk_functions.py")]
+        cmd = [sys.executable, LLK_SCRIPT]
         
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
         
         # Should fail with non-zero exit code due to missing arguments
         assert result.returncode != 0
     
+    def test_get_similar_symbols_cli(self):
+        """Test get_similar_symbols.py with a symbol, checking the printed results."""
+        if not os.path.exists(API_SIG_DB):
+            pytest.skip("Signature database not available")
+        
+        cmd = [sys.executable, SIMILAR_SCRIPT, "add", "--max", "5"]
+        
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        
+        assert result.returncode == 0, f"Command failed with stderr: {result.stderr}"
+        
+        # A header line, then the results as JSON
+        header, _, body = result.stdout.partition("\n")
+        assert header == "Searching for symbols similar to: 'add'"
+        output = json_loads(body)
+        assert output["query"] == "add"
+        assert 0 < len(output["results"]) <= 5
+        for entry in output["results"]:
+            assert set(entry) == {"name", "type", "signature", "include", "similarity"}
+            assert entry["include"].startswith("#include <")
+    
     def test_get_similar_symbols_missing_args(self):
         """Test get_similar_symbols.py with missing arguments."""
-        cmd = [sys.executable, str(self.tools_dir / "get_similar_symbols.py")]
+        cmd = [sys.executable, SIMILAR_SCRIPT]
         
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
         
@@ -144,19 +197,97 @@ class TestSubprocessMode:
         assert result.returncode != 0
 
 
+class TestMCPServer:
+    """Test the tools through the MCP server, using an in-process client."""
+    
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_decompose_function_tool(self, mcp_client):
+        """Test decompose_function through the MCP server."""
+        result = await mcp_client.call_tool("decompose_function", {
+            "file_path": TEST_CPP,
+            "function_name": "test_function"
+        })
+        
+        assert not result.is_error
+        assert isinstance(result.data, dict) and result.data
+    
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_query_llk_functions_tool(self, mcp_client):
+        """Test query_llk_functions through the MCP server."""
+        result = await mcp_client.call_tool("query_llk_functions", {"keyword": "math"})
+        
+        assert not result.is_error
+        assert isinstance(result.data, dict) and result.data
+    
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_find_similar_symbols_tool(self, mcp_client):
+        """Test find_similar_symbols through the MCP server."""
+        result = await mcp_client.call_tool("find_similar_symbols", {"symbol": "add", "max_results": 5})
+        
+        assert not result.is_error
+        assert isinstance(result.data, dict) and result.data
+    
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_rebuilt_database_invalidates_cached_results(self, mcp_client, tmp_path, monkeypatch):
+        """Test that a cached result is not reused once its database has been rebuilt."""
+        import server
+        
+        database = tmp_path / "api_signatures_db.json"
+        database.write_text("{}")
+        monkeypatch.setattr(server, "_API_SIGNATURES_DB", str(database))
+        
+        def cached_keys():
+            return {key for key in server._RESULT_CACHE if key[:2] == ("query_llk_functions", "tile")}
+        
+        try:
+            await mcp_client.call_tool("query_llk_functions", {"keyword": "tile"})
+            first_keys = cached_keys()
+            os.utime(database, ns=(0, 0))
+            await mcp_client.call_tool("query_llk_functions", {"keyword": "tile"})
+            
+            # The second call ran again under a new key instead of hitting the first entry
+            assert len(first_keys) == 1 and len(cached_keys()) == 2
+        finally:
+            for key in cached_keys():
+                del server._RESULT_CACHE[key]
+
+
 class TestMCPIntegration:
     """Test MCP integration by calling functions directly."""
     
-    def setup_method(self):
-        """Setup for each test method."""
-        self.test_cpp_file = str(project_root / "tests" / "decomp_test_target.cpp")
+    @pytest.mark.asyncio
+    async def test_all_direct_tools(self, display_results):
+        """Test all three tools directly, running them concurrently in worker threads."""
+        calls = [
+            ("mcp__tt-metal-tools__decompose_function", decompose_function_sync,
+             {"file_path": TEST_CPP, "function_name": "test_function"}),
+            ("mcp__tt-metal-tools__query_llk_functions", query_llk_functions_sync,
+             {"keyword": "math"}),
+            ("mcp__tt-metal-tools__find_similar_symbols", find_similar_symbols_sync,
+             {"incorrect_symbol": "add", "max_results": 5}),
+        ]
+        
+        # The async wrappers run synchronously, so overlap the sync implementations in threads
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(None, functools.partial(func, **input_args))
+            for _, func, input_args in calls
+        ))
         
+        for (tool_name, _, input_args), result in zip(calls, results):
+            display_tool_output(tool_name, input_args, result, display_results)
+            
+            # Each tool should return a non-empty dictionary
+            assert isinstance(result, dict)
+            assert len(result) > 0
+    
+    @pytest.mark.slow
     @pytest.mark.asyncio
     async def test_decompose_function_direct(self, display_results):
         """Test decompose_function function directly."""
         # Test with a simple function that might exist
         input_args = {
-            "file_path": self.test_cpp_file,
+            "file_path": TEST_CPP,
             "function_name": "test_function"
         }
         result = await decompose_function(**input_args)
@@ -168,6 +299,7 @@ class TestMCPIntegration:
         # The function should have some kind of result structure
         assert len(result) > 0
     
+    @pytest.mark.slow
     @pytest.mark.asyncio
     async def test_query_llk_functions_direct(self, display_results):
         """Test query_llk_functions function directly."""
@@ -181,6 +313,7 @@ class TestMCPIntegration:
         # Should have some structure (functions, headers, etc.)
         assert len(result) > 0
     
+    @pytest.mark.slow
     @pytest.mark.asyncio
     async def test_find_similar_symbols_direct(self, display_results):
         """Test find_similar_symbols function directly."""
@@ -194,190 +327,384 @@ class TestMCPIntegration:
         # Should have some results structure
         assert len(result) > 0
     
-    def test_function_decomposer_class(self):
+    def test_function_decomposer_class(self, decomposer):
         """Test FunctionDecomposer class initialization."""
-        db_path = str(project_root / "tools" / "api_impl_db.json")
-        
         # Should initialize without error if database exists
-        if Path(db_path).exists():
-            decomposer = FunctionDecomposer(db_path)
-            assert decomposer.database_path == db_path
+        if decomposer is not None:
+            assert decomposer.database_path == API_IMPL_DB
         else:
             # Should raise FileNotFoundError if database doesn't exist
             with pytest.raises(FileNotFoundError):
-                FunctionDecomposer(db_path)
+                FunctionDecomposer(API_IMPL_DB)
     
-    def test_llk_function_query_class(self):
-        """Test LLKFunctionQuery class initialization."""
-        db_path = project_root / "tools" / "api_signatures_db.json"
+    def test_decomposer_file_cache_is_bounded(self, decomposer, tmp_path, monkeypatch):
+        """Test that the decomposer only keeps the most recently parsed files."""
+        if decomposer is None:
+            pytest.skip("Implementation database not available")
+        
+        import tools.get_decomposed_function as get_decomposed_function
+        monkeypatch.setattr(get_decomposed_function, "_FILE_CACHE_SIZE", 2)
+        monkeypatch.setattr(decomposer, "_file_functions", get_decomposed_function.OrderedDict())
         
+        paths = []
+        for i in range(3):
+            path = tmp_path / f"file{i}.cpp"
+            path.write_text(f"int f{i}() {{ return {i}; }}\n")
+            paths.append(str(path))
+        
+        decomposer._functions_in_file(paths[0])
+        decomposer._functions_in_file(paths[1])
+        decomposer._functions_in_file(paths[0])  # now the most recently used
+        _, functions = decomposer._functions_in_file(paths[2])
+        
+        assert functions == {"f2": "int f2() { return 2; }"}
+        assert list(decomposer._file_functions) == [paths[0], paths[2]]
+    
+    def test_llk_function_query_class(self, llk_query):
+        """Test LLKFunctionQuery class initialization."""
         # Should initialize without error if database exists
-        if db_path.exists():
-            query_obj = LLKFunctionQuery()
-            assert query_obj.database is not None
+        if llk_query is not None:
+            assert llk_query.database is not None
         else:
             # Should raise FileNotFoundError if database doesn't exist
             with pytest.raises(FileNotFoundError):
                 LLKFunctionQuery()
+
+    def test_llk_query_many_matches_single_queries(self, llk_query):
+        """Test that a batch query returns the same results as one query per keyword."""
+        if llk_query is None:
+            pytest.skip("Signature database not available")
+
+        keywords = ["exp", "MATH", "sqrt", "no_such_function_xyz"]
+        results = llk_query.query_many(keywords)
+
+        assert list(results) == keywords
+        for keyword in keywords:
+            assert results[keyword] == llk_query.query(keyword)
+
+    def test_llk_query_matches_lowercased_names(self, llk_query):
+        """Test that keywords match case-insensitively by lower(), without Unicode case folding."""
+        if llk_query is None:
+            pytest.skip("Signature database not available")
+        
+        # Case folding would turn "ß" into "ss" and match names like "less_than_equal_zero"
+        assert llk_query.query("ss")["headers"]
+        assert llk_query.query("ß")["headers"] == []
+        assert llk_query.query("SS")["headers"] == llk_query.query("ss")["headers"]
     
-    def test_symbol_finder_class(self):
+    def test_symbol_finder_class(self, symbol_finder):
         """Test SymbolFinder class initialization."""
-        db_path = project_root / "tools" / "api_signatures_db.json"
-        
         # Should initialize without error if database exists
-        if db_path.exists():
-            finder = SymbolFinder(debug=False)
-            assert finder.database is not None
+        if symbol_finder is not None:
+            assert symbol_finder.database is not None
         else:
             # Should raise FileNotFoundError if database doesn't exist
             with pytest.raises(FileNotFoundError):
                 SymbolFinder()
+    
+    def test_tools_share_signature_database(self, llk_query, symbol_finder):
+        """Test that tools reading the same database share one parsed copy."""
+        if symbol_finder is None or llk_query is None:
+            pytest.skip("Signature database not available")
+        
+        # Both tools should reference the same parsed database
+        assert symbol_finder.database is llk_query.database
 
+    def test_symbol_finder_index_cache(self, symbol_finder, tmp_path, monkeypatch):
+        """Test that a SymbolFinder built from the index cache skips the JSON database."""
+        if symbol_finder is None:
+            pytest.skip("Signature database not available")
 
-class TestClaudeCodeSDK:
-    """Test MCP tools using Claude Code SDK programmatically."""
+        import tools.get_similar_symbols as get_similar_symbols
+        cache_path = tmp_path / "index.cache.pkl"
+        monkeypatch.setattr(get_similar_symbols, "INDEX_CACHE_PATH", cache_path)
+
+        built = SymbolFinder()
+        assert cache_path.exists()
+
+        cached = SymbolFinder()
+        assert cached._database is None
+        assert cached.search("exp_tile_init", 5) == built.search("exp_tile_init", 5)
+        
+        # Other search paths are indexed from the database but never added to the cache
+        cache_bytes = cache_path.read_bytes()
+        cached.search_paths = ["api/tt-metalium"]
+        assert cache_path.read_bytes() == cache_bytes
+        assert list(tmp_path.iterdir()) == [cache_path]
+
+    @pytest.mark.asyncio
+    async def test_server_caches_tool_results(self):
+        """Test that repeated server tool calls reuse the cached result."""
+        import server
+
+        calls = []
+        def fake_tool(keyword):
+            calls.append(keyword)
+            return {"keyword": keyword, "headers": []}
+
+        key = ("test_tool", "math")
+        try:
+            first = await server._run_cached(key, fake_tool, keyword="math")
+            first["headers"].append("mutated")
+            second = await server._run_cached(key, fake_tool, keyword="math")
+        finally:
+            server._RESULT_CACHE.pop(key, None)
+
+        # The tool runs once, and callers cannot mutate the cached result
+        assert calls == ["math"]
+        assert second == {"keyword": "math", "headers": []}
+
+
+class TestDependencyGraph:
+    """Test the decomposer's dependency ordering on hand-built call graphs."""
     
-    def setup_method(self):
-        """Setup for each test method."""
-        self.test_cpp_file = str(project_root / "tests" / "decomp_test_target.cpp")
+    def test_topological_sort_orders_dependencies_first(self):
+        """Test that dependencies are output before the functions that use them."""
+        functions = {
+            "top": FunctionInfo("top", "", {"mid", "leaf_b"}, 0),
+            "mid": FunctionInfo("mid", "", {"leaf_a", "leaf_b"}, 1),
+            "leaf_a": FunctionInfo("leaf_a", "", set(), 2),
+            "leaf_b": FunctionInfo("leaf_b", "", set(), 1),
+        }
+
+        ordered = list(FunctionDecomposer._topological_sort(functions))
+
+        # Deepest ready function first, ties broken by name
+        assert ordered == ["leaf_a", "leaf_b", "mid", "top"]
+
+    def test_topological_sort_ignores_missing_dependencies(self):
+        """Test that calls without an implementation don't hold back their callers."""
+        functions = {
+            "top": FunctionInfo("top", "", {"leaf", "printf"}, 0),
+            "leaf": FunctionInfo("leaf", "", {"memcpy"}, 1),
+        }
+
+        assert list(FunctionDecomposer._topological_sort(functions)) == ["leaf", "top"]
+
+    def test_topological_sort_orders_cycles_as_a_group(self):
+        """Test that mutually recursive functions are ordered after their dependencies."""
+        functions = {
+            "top": FunctionInfo("top", "", {"even"}, 0),
+            "even": FunctionInfo("even", "", {"odd", "leaf"}, 1),
+            "odd": FunctionInfo("odd", "", {"even"}, 2),
+            "leaf": FunctionInfo("leaf", "", set(), 2),
+        }
+
+        # The even/odd cycle comes out together, deepest member first
+        assert list(FunctionDecomposer._topological_sort(functions)) == ["leaf", "odd", "even", "top"]
+
+    def test_depth_level_is_shortest_call_distance(self):
+        """Test that a function reached along several call paths gets its shortest depth."""
+        functions = {
+            "top": FunctionInfo("top", "", {"mid", "leaf"}),
+            "mid": FunctionInfo("mid", "", {"leaf"}),
+            "leaf": FunctionInfo("leaf", "", set()),
+        }
+
+        FunctionDecomposer._assign_depth_levels("top", functions)
+
+        assert {name: info.depth_level for name, info in functions.items()} == {
+            "top": 0, "mid": 1, "leaf": 1
+        }
+
+
+class TestSignatureDatabaseHelpers:
+    """Test the signature database builder helpers on small inputs."""
     
-    @pytest.mark.skipif(
-        not (os.environ.get("ANTHROPIC_AUTH_TOKEN") or os.environ.get("ANTHROPIC_API_KEY")),
-        reason="ANTHROPIC_AUTH_TOKEN or ANTHROPIC_API_KEY not set - skipping Claude SDK tests"
-    )
-    def test_claude_sdk_decompose_function(self):
-        """Test decompose_function via Claude Code SDK."""
+    def test_call_index_matches_linear_scan(self):
+        """Test that the call index agrees with scanning every call, including nested calls."""
+        source = b"void f() { a(b(c(1), d(2)), e(3)); g(h(i(4))); x = j(5) + k(l(6), 7); }"
+        tree_id = parse_bytes(source)
         try:
-            import anthropic
+            call_ranges = [call['byte_range'] for call in query(tree_id, "(call_expression) @call")]
+            call_index = build_call_index(tree_id)
+            assert len(call_ranges) == 11
             
-            # Mock the Claude SDK call
-            with patch('anthropic.Client') as mock_client:
-                mock_response = MagicMock()
-                mock_response.content = [MagicMock()]
-                mock_response.content[0].text = json.dumps({
-                    "original_function": "test_function",
-                    "dependencies": []
-                })
-                mock_client.return_value.messages.create.return_value = mock_response
-                
-                # This would be the actual SDK call structure
-                client = anthropic.Client()
-                response = client.messages.create(
-                    model="claude-3-sonnet-20240229",
-                    max_tokens=1000,
-                    tools=[{
-                        "name": "decompose_function",
-                        "description": "Decompose a function into its dependencies",
-                        "input_schema": {
-                            "type": "object",
-                            "properties": {
-                                "file_path": {"type": "string"},
-                                "function_name": {"type": "string"}
-                            },
-                            "required": ["file_path", "function_name"]
-                        }
-                    }],
-                    messages=[{
-                        "role": "user",
-                        "content": f"Use the decompose_function tool on {self.test_cpp_file} for function test_function"
-                    }]
-                )
-                
-                assert response is not None
-                
-        except ImportError:
-            pytest.skip("anthropic package not available")
+            # Check every possible node range against the old linear scan
+            for start in range(len(source) + 1):
+                for end in range(start, len(source) + 1):
+                    expected = any(call_start <= start and end <= call_end
+                                   for call_start, call_end in call_ranges)
+                    assert is_inside_call_expression(tree_id, (start, end), call_index) == expected, (start, end)
+        finally:
+            discard_tree(tree_id)
     
-    @pytest.mark.skipif(
-        not (os.environ.get("ANTHROPIC_AUTH_TOKEN") or os.environ.get("ANTHROPIC_API_KEY")),
-        reason="ANTHROPIC_AUTH_TOKEN or ANTHROPIC_API_KEY not set - skipping Claude SDK tests"
-    )
-    def test_claude_sdk_query_llk_functions(self):
-        """Test query_llk_functions via Claude Code SDK."""
-        try:
-            import anthropic
-            
-            # Mock the Claude SDK call
-            with patch('anthropic.Client') as mock_client:
-                mock_response = MagicMock()
-                mock_response.content = [MagicMock()]
-                mock_response.content[0].text = json.dumps({
-                    "functions": ["math_func1", "math_func2"],
-                    "headers": ["math.h"]
-                })
-                mock_client.return_value.messages.create.return_value = mock_response
-                
-                client = anthropic.Client()
-                response = client.messages.create(
-                    model="claude-3-sonnet-20240229",
-                    max_tokens=1000,
-                    tools=[{
-                        "name": "query_llk_functions",
-                        "description": "Query LLK functions by keyword",
-                        "input_schema": {
-                            "type": "object",
-                            "properties": {
-                                "keyword": {"type": "string"}
-                            },
-                            "required": ["keyword"]
-                        }
-                    }],
-                    messages=[{
-                        "role": "user",
-                        "content": "Use the query_llk_functions tool to search for 'math' functions"
-                    }]
-                )
-                
-                assert response is not None
-                
-        except ImportError:
-            pytest.skip("anthropic package not available")
+    def test_iter_captures_checks_tree_at_call(self):
+        """Test that iter_captures rejects an unknown tree when called, not when first iterated."""
+        with pytest.raises(ValueError):
+            iter_captures("no-such-tree", "(call_expression) @call")
+    
+    @staticmethod
+    def _scan_words_by_char(param: str) -> list:
+        """The original character-by-character word split that _scan_words replaced."""
+        words = []
+        current_word = []
+        depth = 0
+        for char in param:
+            if char in '<([':
+                depth += 1
+                current_word.append(char)
+            elif char in '>)]':
+                depth -= 1
+                current_word.append(char)
+            elif char in ' \t' and depth == 0:
+                if current_word:
+                    words.append(''.join(current_word))
+                    current_word = []
+            else:
+                current_word.append(char)
+        if current_word:
+            words.append(''.join(current_word))
+        return words
+    
+    def test_scan_words_matches_character_scan(self):
+        """Test that the regex word scan splits parameters exactly like the character scan."""
+        params = [
+            "", " ", "int", "const int x", "  unsigned  long\tcount ",
+            "std::vector<std::pair<int, float>> & items",
+            "void (*callback)(int, char)", "int values[N + 1]",
+            "const std::array<uint32_t, 4>& arr", "T&& value", "...",
+            "std::map<int, std::vector<int>>::iterator it",
+            "a>b c", "(x y) z", "unbalanced< a b", "a ) b ( c",
+        ]
+        # Random strings over the delimiters and a few word characters
+        rng = random.Random(0)
+        alphabet = "<>()[] \tab_:,*&"
+        params += [''.join(rng.choice(alphabet) for _ in range(rng.randrange(20)))
+                   for _ in range(2000)]
+        
+        for param in params:
+            words = [param[start:end] for start, end in _scan_words(param)]
+            assert words == self._scan_words_by_char(param), repr(param)
+    
+    def test_group_components_by_declaration_kind(self):
+        """Test that components go to the innermost enclosing declaration of their own kind."""
+        decls = [
+            ('definition_node', (0, 100)),
+            ('declaration_node', (40, 60)),  # local declaration inside the body
+            ('template_decl_node', (200, 260)),
+            ('declaration_node', (210, 260)),  # the declaration the template wraps
+        ]
+        components = [
+            ('def_type', 0, 4), ('def_name', 5, 8), ('def_params', 8, 12),
+            ('decl_type', 40, 43), ('decl_name', 44, 47), ('decl_params', 47, 50),
+            ('template_decl_type', 210, 214), ('template_decl_name', 215, 220),
+            ('template_decl_params', 220, 230),
+            ('decl_type', 210, 214), ('decl_name', 215, 220), ('decl_params', 220, 230),
+            ('def_name', 50, 55),  # a later component of the same kind wins
+            ('decl_name', 300, 305),  # outside every declaration
+        ]
+        
+        assert _group_components(decls, components) == {
+            (0, 100): {'return_type': (0, 4), 'name': (50, 55), 'parameters': (8, 12)},
+            (40, 60): {'return_type': (40, 43), 'name': (44, 47), 'parameters': (47, 50)},
+            (200, 260): {'return_type': (210, 214), 'name': (215, 220), 'parameters': (220, 230)},
+            (210, 260): {'return_type': (210, 214), 'name': (215, 220), 'parameters': (220, 230)},
+        }
+
+
+class FakeAnthropicClient:
+    """Minimal stand-in for anthropic.Client that answers with a canned tool payload."""
+    
+    payload: dict = {}
+    
+    def __init__(self, *args, **kwargs):
+        self.messages = SimpleNamespace(create=self._create)
+    
+    def _create(self, **kwargs):
+        return SimpleNamespace(content=[SimpleNamespace(text=json.dumps(self.payload))])
+
+
+@pytest.fixture
+def mocked_anthropic(monkeypatch):
+    """Return a function that installs FakeAnthropicClient with a given payload."""
+    anthropic = pytest.importorskip("anthropic")
+    
+    def install(payload: dict):
+        client_cls = type("FakeClient", (FakeAnthropicClient,), {"payload": payload})
+        monkeypatch.setattr(anthropic, "Client", client_cls)
+        return anthropic
+    
+    return install
+
+
+# (tool name, description, input schema, canned response payload)
+CLAUDE_SDK_CASES = [
+    (
+        "decompose_function",
+        "Decompose a function into its dependencies",
+        {
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string"},
+                "function_name": {"type": "string"}
+            },
+            "required": ["file_path", "function_name"]
+        },
+        {"original_function": "test_function", "dependencies": []}
+    ),
+    (
+        "query_llk_functions",
+        "Query LLK functions by keyword",
+        {
+            "type": "object",
+            "properties": {
+                "keyword": {"type": "string"}
+            },
+            "required": ["keyword"]
+        },
+        {"functions": ["math_func1", "math_func2"], "headers": ["math.h"]}
+    ),
+    (
+        "find_similar_symbols",
+        "Find similar symbols by name",
+        {
+            "type": "object",
+            "properties": {
+                "symbol": {"type": "string"},
+                "max_results": {"type": "integer"}
+            },
+            "required": ["symbol"]
+        },
+        {"symbols": ["add_func", "add_value"], "total_found": 2}
+    ),
+]
+
+
+class TestClaudeCodeSDK:
+    """Test MCP tools using Claude Code SDK programmatically."""
     
     @pytest.mark.skipif(
         not (os.environ.get("ANTHROPIC_AUTH_TOKEN") or os.environ.get("ANTHROPIC_API_KEY")),
         reason="ANTHROPIC_AUTH_TOKEN or ANTHROPIC_API_KEY not set - skipping Claude SDK tests"
     )
-    def test_claude_sdk_find_similar_symbols(self):
-        """Test find_similar_symbols via Claude Code SDK."""
-        try:
-            import anthropic
-            
-            # Mock the Claude SDK call
-            with patch('anthropic.Client') as mock_client:
-                mock_response = MagicMock()
-                mock_response.content = [MagicMock()]
-                mock_response.content[0].text = json.dumps({
-                    "symbols": ["add_func", "add_value"],
-                    "total_found": 2
-                })
-                mock_client.return_value.messages.create.return_value = mock_response
-                
-                client = anthropic.Client()
-                response = client.messages.create(
-                    model="claude-3-sonnet-20240229",
-                    max_tokens=1000,
-                    tools=[{
-                        "name": "find_similar_symbols",
-                        "description": "Find similar symbols by name",
-                        "input_schema": {
-                            "type": "object",
-                            "properties": {
-                                "symbol": {"type": "string"},
-                                "max_results": {"type": "integer"}
-                            },
-                            "required": ["symbol"]
-                        }
-                    }],
-                    messages=[{
-                        "role": "user",
-                        "content": "Use the find_similar_symbols tool to search for 'add' symbols"
-                    }]
-                )
-                
-                assert response is not None
-                
-        except ImportError:
-            pytest.skip("anthropic package not available")
+    @pytest.mark.parametrize(
+        "tool_name,description,schema,payload",
+        CLAUDE_SDK_CASES,
+        ids=[case[0] for case in CLAUDE_SDK_CASES]
+    )
+    def test_claude_sdk_tool(self, mocked_anthropic, tool_name, description, schema, payload):
+        """Test each tool via the Claude Code SDK call structure."""
+        anthropic = mocked_anthropic(payload)
+        
+        # This would be the actual SDK call structure
+        client = anthropic.Client()
+        response = client.messages.create(
+            model="claude-3-sonnet-20240229",
+            max_tokens=1000,
+            tools=[{
+                "name": tool_name,
+                "description": description,
+                "input_schema": schema
+            }],
+            messages=[{
+                "role": "user",
+                "content": f"Use the {tool_name} tool"
+            }]
+        )
+        
+        assert response is not None
+        assert json.loads(response.content[0].text) == payload
 
 
 class TestErrorHandling:
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Shared loader for the TT-Metal API databases used by the MCP tools.
+
+Every tool reads one of the JSON databases next to this file. Loading goes
+through here so each database is parsed once per process and shared by all
+tools, instead of being re-parsed on every tool call.
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Resolved database path -> ((mtime_ns, size), parsed database)
+_DB_CACHE: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+_LOCK = threading.Lock()
+
+
+def _loads(data: bytes) -> Dict[str, Any]:
+    """Parse JSON with orjson when available, falling back to the stdlib."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_api_database(database_path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Load a JSON API database, reusing the parsed copy while the file is unchanged.
+
+    The returned dictionary is shared between callers and must not be modified.
+
+    Args:
+        database_path: Path to the JSON database file
+
+    Returns:
+        The parsed database
+    """
+    path = Path(database_path)
+    if not path.exists():
+        raise FileNotFoundError(f"Database not found at: {path}")
+
+    stat = path.stat()
+    signature = (stat.st_mtime_ns, stat.st_size)
+    key = str(path.resolve())
+
+    # Hold the lock while parsing so concurrent callers wait for one load
+    with _LOCK:
+        cached = _DB_CACHE.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        with open(path, 'rb') as f:
+            database = _loads(f.read())
+
+        _DB_CACHE[key] = (signature, database)
+        return database
+
+
+def database_mtime_ns(database_path: Union[str, Path]) -> Optional[int]:
+    """
+    Modification time of a database file, for keying objects built from it.
+
+    Returns None if the file does not exist, so callers can let the loader
+    report the missing database.
+    """
+    try:
+        return Path(database_path).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
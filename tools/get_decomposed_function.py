@@ -3,19 +3,38 @@
 Function Decomposer - Outputs all functions in dependency order, original form.
 """
 
+import io
 import re
-import json
+import heapq
+from array import array
 import argparse
 from pathlib import Path
-from typing import Dict, List, Set, Optional, Tuple, Any
-from collections import defaultdict, OrderedDict
+from typing import Dict, List, Set, Optional, Tuple, Any, TextIO
+from collections import OrderedDict, deque
+from functools import lru_cache
 from dataclasses import dataclass, field
-import tempfile
 import asyncio
 import sys
 import os
+import threading
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from api_extractors.tree_sitter_backend import parse_file, query
+from api_extractors.tree_sitter_backend import parse_bytes, discard_tree, iter_captures, query
+from tools.api_database import database_mtime_ns, load_api_database
+
+# Name of the called function at the start of a call expression (handles template parameters)
+_CALL_RE = re.compile(r'((?:\w+::)*\w+)(?:<[^>]+>)?\s*\(')
+
+# Call-like names that are not function calls. MATH is deliberately absent: we want to analyze MATH calls
+_SKIP = frozenset({
+    'if', 'while', 'for', 'switch', 'return', 'sizeof',
+    'static_cast', 'dynamic_cast', 'reinterpret_cast', 'const_cast'
+})
+
+# Function definitions whose declarator is a plain function declarator
+_FUNCTION_DEFINITION_QUERY = "(function_definition declarator: (function_declarator)) @func"
+
+# Number of parsed source files each decomposer keeps
+_FILE_CACHE_SIZE = 32
 
 @dataclass
 class FunctionCall:
@@ -35,15 +54,132 @@ class FunctionInfo:
     body: str
     dependencies: Set[str] = field(default_factory=set)
     depth_level: int = 0  # Distance from original function
+    _resolved_deps: Set[str] = field(default_factory=set, repr=False)  # Dependencies that were analyzed
 
 @dataclass
 class AnalysisResult:
     """Result of dependency analysis."""
-    functions: OrderedDict[str, FunctionInfo] = field(default_factory=OrderedDict)
+    functions: Dict[str, FunctionInfo] = field(default_factory=dict)
     original_function_name: str = ""
     missing_functions: Set[str] = field(default_factory=set)
     atomic_functions: Set[str] = field(default_factory=set)
 
+def _strongly_connected_components(graph: List[List[int]]) -> List[List[int]]:
+    """
+    Find the strongly connected components of a graph with Tarjan's algorithm.
+    
+    Iterative, so long dependency chains don't hit the recursion limit.
+    
+    Args:
+        graph: Adjacency lists, indexed by node id
+        
+    Returns:
+        The components, each a sorted list of node ids
+    """
+    index = [-1] * len(graph)
+    low = [0] * len(graph)
+    on_stack = bytearray(len(graph))
+    stack = []
+    components = []
+    counter = 0
+    
+    for root in range(len(graph)):
+        if index[root] != -1:
+            continue
+        
+        # Each frame is (node, position of the next edge to follow)
+        work = [(root, 0)]
+        while work:
+            node, pos = work[-1]
+            if pos == 0:
+                index[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = 1
+            
+            if pos < len(graph[node]):
+                work[-1] = (node, pos + 1)
+                succ = graph[node][pos]
+                if index[succ] == -1:
+                    work.append((succ, 0))
+                elif on_stack[succ]:
+                    low[node] = min(low[node], index[succ])
+                continue
+            
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            
+            if low[node] == index[node]:
+                members = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = 0
+                    members.append(member)
+                    if member == node:
+                        break
+                members.sort()
+                components.append(members)
+    
+    return components
+
+def _find_function_by_regex(content: str, function_name: str) -> Optional[str]:
+    """Find a function definition with a simple signature regex and brace matching."""
+    pattern = rf'(?:inline\s+)?(?:void|int|auto|ALWI)\s+{re.escape(function_name)}\s*\([^)]*\)\s*\{{'
+    match = re.search(pattern, content)
+    if not match:
+        return None
+    
+    # Extract the full function body
+    start = match.start()
+    brace_count = 0
+    i = content.find('{', start)
+    end = i
+    
+    while i < len(content):
+        if content[i] == '{':
+            brace_count += 1
+        elif content[i] == '}':
+            brace_count -= 1
+            if brace_count == 0:
+                end = i + 1
+                break
+        i += 1
+    
+    return content[start:end]
+
+@lru_cache(maxsize=None)
+def _build_name_variants(name: str) -> Tuple[str, ...]:
+    """
+    Generate all possible variants of a function name for lookup.
+    
+    Cached, since the same names are resolved over and over while indexing
+    the database and walking the dependency graph.
+    """
+    variants = [name]
+    
+    # Handle namespace separators (:: vs _)
+    if '::' in name:
+        # Try with underscores
+        variants.append(name.replace('::', '_'))
+        
+        # Try just the last component
+        parts = name.split('::')
+        variants.append(parts[-1])
+        
+        # Try joining with single underscore
+        variants.append('_'.join(parts))
+    elif '_' in name:
+        # Try with :: at various positions: replace each underscore in turn
+        pos = name.find('_')
+        while pos != -1:
+            variants.append(f"{name[:pos]}::{name[pos + 1:]}")
+            pos = name.find('_', pos + 1)
+    
+    return tuple(variants)
+
+
 class FunctionDecomposer:
     """Analyzes function dependencies and outputs them in dependency order."""
     
@@ -52,12 +188,15 @@ class FunctionDecomposer:
         self.database = None
         self.implementations = {}
         self.function_index = {}
+        self._impl_by_variant: Dict[str, str] = {}  # name variant -> implementation code
+        # path -> (mtime/size, parsed functions) of recently used files, least recent first
+        self._file_functions: "OrderedDict[str, Tuple[Tuple[int, int], Tuple[bytes, Dict[str, str]]]]" = OrderedDict()
+        self._file_functions_lock = threading.Lock()  # the decomposer is shared by server threads
         self._load_database()
         
     def _load_database(self):
         """Load the API database and build indices."""
-        with open(self.database_path, 'r') as f:
-            self.database = json.load(f)
+        self.database = load_api_database(self.database_path)
         
         self.implementations = self.database.get("implementations", {})
         
@@ -85,6 +224,11 @@ class FunctionDecomposer:
                     for variant in base_variants:
                         if variant not in self.function_index:
                             self.function_index[variant] = api_key
+        
+        # Resolve the index to implementation code once, so lookups are a single dict hit
+        for variant, api_key in self.function_index.items():
+            if api_key in self.implementations:
+                self._impl_by_variant[variant] = self.implementations[api_key]["code"]
     
     def analyze_dependencies(self, 
                            file_path: str, 
@@ -108,9 +252,9 @@ class FunctionDecomposer:
         result = AnalysisResult()
         result.original_function_name = function_name
         
-        # Recursively analyze dependencies
+        # Analyze all reachable dependencies
         visited = set()
-        self._analyze_function_recursive(function_name, original_code, result, visited, 0)
+        self._analyze_function_graph(function_name, original_code, result, visited)
         
         # Reorder functions by dependency (dependencies first)
         ordered_functions = self._topological_sort(result.functions)
@@ -118,94 +262,133 @@ class FunctionDecomposer:
         
         return result
     
-    def _analyze_function_recursive(self,
-                                  func_name: str,
-                                  func_body: str,
-                                  result: AnalysisResult,
-                                  visited: Set[str],
-                                  depth: int):
-        """Recursively analyze a function and its dependencies."""
-        if func_name in visited:
-            return
-        
-        visited.add(func_name)
-        
-        # Create function info
-        func_info = FunctionInfo(
-            name=func_name,
-            body=func_body,
-            depth_level=depth
-        )
-        
-        # Find all calls in this function
-        calls = self._find_all_calls_in_code(func_body)
-        
-        # Process each call
-        for call in calls:
+    def _analyze_function_graph(self,
+                                func_name: str,
+                                func_body: str,
+                                result: AnalysisResult,
+                                visited: Set[str]):
+        """Analyze a function and its dependencies with an explicit worklist."""
+        func_name = sys.intern(func_name)
+        stack = [(func_name, func_body)]
+        
+        while stack:
+            name, body = stack.pop()
+            if name in visited:
+                continue
             
-            # Add as dependency
-            func_info.dependencies.add(call.name)
+            visited.add(name)
             
-            # Find implementation
-            impl = self._find_implementation(call.name)
+            # Create function info
+            func_info = FunctionInfo(name=name, body=body)
             
-            if impl:
-                # Recursively analyze this dependency
-                self._analyze_function_recursive(call.name, impl, result, visited, depth + 1)
-            else:
-                result.missing_functions.add(call.name)
+            # Find all calls in this function
+            calls = self._find_all_calls_in_code(body)
+            
+            # Process each call
+            for call in calls:
+                
+                # Add as dependency
+                func_info.dependencies.add(call.name)
+                
+                if call.name in visited:
+                    continue
+                
+                # Find implementation
+                impl = self._find_implementation(call.name)
+                
+                if impl:
+                    stack.append((call.name, impl))
+                else:
+                    result.missing_functions.add(call.name)
+            
+            # Add this function to results
+            result.functions[name] = func_info
         
-        # Add this function to results
-        result.functions[func_name] = func_info
+        self._assign_depth_levels(func_name, result.functions)
     
-    def _topological_sort(self, functions: Dict[str, FunctionInfo]) -> OrderedDict[str, FunctionInfo]:
-        """Sort functions so dependencies come before functions that use them."""
-        # Build adjacency list (reverse dependencies)
-        dependents = defaultdict(set)
-        in_degree = defaultdict(int)
-        
-        for func_name, func_info in functions.items():
-            in_degree[func_name] = len(func_info.dependencies)
-            for dep in func_info.dependencies:
-                if dep in functions:  # Only count dependencies we have
-                    dependents[dep].add(func_name)
-        
-        # Find all nodes with no dependencies
-        queue = [func for func in functions if in_degree[func] == 0]
-        ordered = OrderedDict()
+    @staticmethod
+    def _assign_depth_levels(root: str, functions: Dict[str, FunctionInfo]):
+        """Set each function's depth_level to its shortest call distance from root."""
+        depths = {root: 0}
+        queue = deque([root])
         
         while queue:
-            # Sort queue by depth level and name for consistent ordering
-            queue.sort(key=lambda f: (-functions[f].depth_level, f))
-            current = queue.pop(0)
+            name = queue.popleft()
+            functions[name].depth_level = depths[name]
+            for dep in functions[name].dependencies:
+                if dep in functions and dep not in depths:
+                    depths[dep] = depths[name] + 1
+                    queue.append(dep)
+    
+    @staticmethod
+    def _topological_sort(functions: Dict[str, FunctionInfo]) -> Dict[str, FunctionInfo]:
+        """
+        Sort functions so dependencies come before functions that use them.
+        
+        Mutually recursive functions are collapsed into one group first, so
+        cycles are ordered with the rest of the graph instead of being appended
+        at the end. Members of a group are output deepest first, then by name.
+        """
+        # Number functions in priority order (deepest first, then by name), so the
+        # graph can be kept in flat lists and the ready heap holds plain ints
+        names = sorted(functions, key=lambda name: (-functions[name].depth_level, name))
+        name_to_id = {name: i for i, name in enumerate(names)}
+        
+        # Build adjacency list of dependencies
+        deps: List[List[int]] = []
+        for func_name in names:
+            func_info = functions[func_name]
+            # Only count dependencies we have; missing ones would never be released
+            func_info._resolved_deps = func_info.dependencies & functions.keys()
+            deps.append([name_to_id[dep] for dep in func_info._resolved_deps])
+        
+        # Collapse cycles; each component is listed by its members' ids in ascending order
+        components = _strongly_connected_components(deps)
+        component_of = array('i', bytes(4 * len(names)))
+        for comp_id, members in enumerate(components):
+            for func_id in members:
+                component_of[func_id] = comp_id
+        
+        # Build the condensed graph (reverse dependencies between components)
+        dependents: List[List[int]] = [[] for _ in components]
+        in_degree = array('i', bytes(4 * len(components)))
+        for func_id, func_deps in enumerate(deps):
+            comp_id = component_of[func_id]
+            for dep in func_deps:
+                dep_comp = component_of[dep]
+                if dep_comp != comp_id:
+                    dependents[dep_comp].append(comp_id)
+                    in_degree[comp_id] += 1
+        
+        # Min-heap of ready components, keyed by their highest-priority member
+        heap = [(members[0], comp_id) for comp_id, members in enumerate(components)
+                if in_degree[comp_id] == 0]
+        heapq.heapify(heap)
+        ordered = {}
+        
+        while heap:
+            _, current = heapq.heappop(heap)
             
             # Add to ordered list
-            ordered[current] = functions[current]
+            for func_id in components[current]:
+                ordered[names[func_id]] = functions[names[func_id]]
             
             # Reduce in-degree for all dependents
             for dependent in dependents[current]:
                 in_degree[dependent] -= 1
                 if in_degree[dependent] == 0:
-                    queue.append(dependent)
-        
-        # Add any remaining functions (cycles) at the end
-        for func_name, func_info in functions.items():
-            if func_name not in ordered:
-                ordered[func_name] = func_info
+                    heapq.heappush(heap, (components[dependent][0], dependent))
         
         return ordered
     
     def _find_all_calls_in_code(self, code: str) -> List[FunctionCall]:
         """Find all function calls in the given code."""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.cpp', delete=False) as f:
-            f.write(code)
-            temp_path = f.name
-        
         calls = []
         
+        # Parse the code in memory; the tree is only needed for this query
+        tree_id = parse_bytes(code.encode('utf-8'))
+        
         try:
-            tree_id = parse_file(temp_path)
-            
             # Simple query for all call expressions
             call_query = "(call_expression) @call"
             
@@ -213,19 +396,16 @@ class FunctionDecomposer:
             
             for result in results:
                 call_start, call_end = result['byte_range']
-                call_text = code[call_start:call_end]
+                call_text = result['text']
                 
                 # Extract function name from the call text
-                # Updated regex to handle template parameters
-                import re
-                match = re.match(r'((?:\w+::)*\w+)(?:<[^>]+>)?\s*\(', call_text)
+                match = _CALL_RE.match(call_text)
                 if match:
-                    func_name = match.group(1)
+                    # Interned, since the same names recur across the whole graph
+                    func_name = sys.intern(match.group(1))
                     
-                    # Skip control structures but NOT MATH (we want to analyze MATH calls)
-                    if func_name not in ['if', 'while', 'for', 'switch', 'return', 'sizeof', 
-                                    'static_cast', 'dynamic_cast', 'reinterpret_cast', 
-                                    'const_cast']:  # Removed 'MATH' from here
+                    # Skip control structures and casts
+                    if func_name not in _SKIP:
                         calls.append(FunctionCall(
                             name=func_name,
                             full_match=call_text,
@@ -235,88 +415,103 @@ class FunctionDecomposer:
                             is_macro_arg=False
                         ))
         finally:
-            import os
-            os.unlink(temp_path)
+            discard_tree(tree_id)
         
         return calls
     
     def find_function_in_file(self, file_path: str, function_name: str) -> Optional[str]:
         """Find a function implementation in a specific file."""
+        file_functions = self._functions_in_file(file_path)
+        if file_functions is None:
+            return None
+        
+        source, functions = file_functions
+        if function_name in functions:
+            return functions[function_name]
+        
+        # Macro-heavy code can defeat the parser; fall back to a signature regex
+        return _find_function_by_regex(source.decode('utf-8', 'ignore'), function_name)
+    
+    def _functions_in_file(self, file_path: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        """
+        Map every function defined in a file to its full definition text.
+        
+        The file is parsed once with tree-sitter and the result is cached until
+        the file changes, for the _FILE_CACHE_SIZE most recently used files.
+        Overloads map to the first definition in the file.
+        
+        Returns:
+            (file source, {function name: definition}), or None if the file can't be read
+        """
         try:
-            with open(file_path, 'r') as f:
-                content = f.read()
-            
-            # Simple regex to find function definition
-            pattern = rf'(?:inline\s+)?(?:void|int|auto|ALWI)\s+{re.escape(function_name)}\s*\([^)]*\)\s*\{{'
-            match = re.search(pattern, content)
+            stat = os.stat(file_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            with self._file_functions_lock:
+                cached = self._file_functions.get(file_path)
+                if cached is not None and cached[0] == signature:
+                    self._file_functions.move_to_end(file_path)
+                    return cached[1]
             
-            if match:
-                # Extract the full function body
-                start = match.start()
-                brace_count = 0
-                i = content.find('{', start)
-                end = i
-                
-                while i < len(content):
-                    if content[i] == '{':
-                        brace_count += 1
-                    elif content[i] == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            end = i + 1
-                            break
-                    i += 1
-                
-                return content[start:end]
+            with open(file_path, 'rb') as f:
+                source = f.read()
         except Exception as e:
             print(f"Error reading file {file_path}: {e}")
+            return None
         
-        return None
+        tree_id = parse_bytes(source)
+        try:
+            first_start = {}
+            functions = {}
+            for _, node in iter_captures(tree_id, _FUNCTION_DEFINITION_QUERY):
+                name_node = node.child_by_field_name('declarator').child_by_field_name('declarator')
+                name = source[name_node.start_byte:name_node.end_byte].decode('utf-8', 'ignore')
+                if name not in first_start or node.start_byte < first_start[name]:
+                    first_start[name] = node.start_byte
+                    functions[name] = source[node.start_byte:node.end_byte].decode('utf-8', 'ignore')
+        finally:
+            discard_tree(tree_id)
+        
+        with self._file_functions_lock:
+            self._file_functions[file_path] = (signature, (source, functions))
+            self._file_functions.move_to_end(file_path)
+            if len(self._file_functions) > _FILE_CACHE_SIZE:
+                self._file_functions.popitem(last=False)
+        return source, functions
     
-    def _build_name_variants(self, name: str) -> List[str]:
+    def _build_name_variants(self, name: str) -> Tuple[str, ...]:
         """Generate all possible variants of a function name for lookup."""
-        variants = [name]
-        
-        # Handle namespace separators (:: vs _)
-        if '::' in name:
-            # Try with underscores
-            variants.append(name.replace('::', '_'))
-            
-            # Try just the last component
-            parts = name.split('::')
-            variants.append(parts[-1])
-            
-            # Try joining with single underscore
-            variants.append('_'.join(parts))
-        elif '_' in name:
-            # Try with :: at various positions
-            parts = name.split('_')
-            
-            # Try different namespace splits
-            for i in range(1, len(parts)):
-                namespace = '_'.join(parts[:i])
-                func = '_'.join(parts[i:])
-                variants.append(f"{namespace}::{func}")
-        
-        return variants
+        return _build_name_variants(name)
     
     def _find_implementation(self, function_name: str) -> Optional[str]:
         """Find the implementation of a function using name variants."""
-        # Generate all possible name variants
-        variants = self._build_name_variants(function_name)
-        
-        # Try each variant
-        for variant in variants:
-            if variant in self.function_index:
-                api_key = self.function_index[variant]
-                if api_key in self.implementations:
-                    return self.implementations[api_key]["code"]
-        
-        return None
+        impl = self._impl_by_variant.get(function_name)
+        if impl is not None:
+            return impl
+        
+        # Try each possible name variant
+        return next((self._impl_by_variant[variant]
+                     for variant in self._build_name_variants(function_name)
+                     if variant in self._impl_by_variant), None)
     
-    def format_output(self, result: AnalysisResult, include_comments: bool = False) -> str:
-        """Format the analysis result as requested."""
-        output = []
+    def format_output(self,
+                      result: AnalysisResult,
+                      include_comments: bool = False,
+                      writer: Optional[TextIO] = None) -> Optional[str]:
+        """
+        Format the analysis result as requested.
+        
+        Lines are written to writer as they are produced. Without a writer the
+        output is collected in memory and returned as a string.
+        """
+        out = writer if writer is not None else io.StringIO()
+        first_line = True
+        
+        def emit(line: str):
+            nonlocal first_line
+            if not first_line:
+                out.write('\n')
+            out.write(line)
+            first_line = False
         
         # Output each function in dependency order
         for func_name, func_info in result.functions.items():
@@ -328,48 +523,59 @@ class FunctionDecomposer:
             if include_comments:
                 if func_info.dependencies:
                     deps_list = ", ".join(sorted(func_info.dependencies))
-                    output.append(f"// Used by: functions that depend on {func_name}")
+                    emit(f"// Used by: functions that depend on {func_name}")
                 else:
-                    output.append(f"// Leaf function (no dependencies)")
+                    emit(f"// Leaf function (no dependencies)")
             
             # Output the function
-            output.append(func_info.body)
-            output.append("")  # Blank line
+            emit(func_info.body)
+            emit("")  # Blank line
         
         # Output the original function last
         if result.original_function_name in result.functions:
             if include_comments:
-                output.append("// Original function")
-            output.append(result.functions[result.original_function_name].body)
+                emit("// Original function")
+            emit(result.functions[result.original_function_name].body)
         
         # Add summary at the end
         if include_comments:
-            output.append("\n/*")
-            output.append(f"Dependency Analysis Summary:")
-            output.append(f"  Total functions: {len(result.functions)}")
-            output.append(f"  Maximum depth: {max((f.depth_level for f in result.functions.values()), default=0)}")
+            emit("\n/*")
+            emit(f"Dependency Analysis Summary:")
+            emit(f"  Total functions: {len(result.functions)}")
+            emit(f"  Maximum depth: {max((f.depth_level for f in result.functions.values()), default=0)}")
             
             if result.atomic_functions:
-                output.append(f"  Atomic functions called: {len(result.atomic_functions)}")
+                emit(f"  Atomic functions called: {len(result.atomic_functions)}")
                 for func in sorted(result.atomic_functions)[:10]:
-                    output.append(f"    - {func}")
+                    emit(f"    - {func}")
                 if len(result.atomic_functions) > 10:
-                    output.append(f"    ... and {len(result.atomic_functions) - 10} more")
+                    emit(f"    ... and {len(result.atomic_functions) - 10} more")
             
             if result.missing_functions:
-                output.append(f"  Missing implementations: {len(result.missing_functions)}")
+                emit(f"  Missing implementations: {len(result.missing_functions)}")
                 for func in sorted(result.missing_functions)[:5]:
-                    output.append(f"    - {func}")
+                    emit(f"    - {func}")
             
-            output.append("*/")
+            emit("*/")
         
-        return '\n'.join(output)
+        if writer is None:
+            return out.getvalue()
+        return None
+
+@lru_cache(maxsize=4)
+def _get_decomposer(database_path: str, mtime_ns: Optional[int]) -> FunctionDecomposer:
+    """Build a FunctionDecomposer once per database file version."""
+    return FunctionDecomposer(database_path)
 
 async def decompose_function(file_path: str, function_name: str) -> Dict[str, Any]:
     """Async wrapper for function decomposition."""
-    database_path = Path(__file__).parent / "api_impl_db.json"
+    return decompose_function_sync(file_path, function_name)
+
+def decompose_function_sync(file_path: str, function_name: str) -> Dict[str, Any]:
+    """Synchronous function decomposition, for use from worker threads."""
+    database_path = str(Path(__file__).parent / "api_impl_db.json")
     try:
-        analyzer = FunctionDecomposer(database_path)
+        analyzer = _get_decomposer(database_path, database_mtime_ns(database_path))
         result = analyzer.analyze_dependencies(file_path, function_name)
         
         # Format the output
@@ -6,10 +6,14 @@ Simple substring search in function names.
 
 import json
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from collections import defaultdict
+from functools import lru_cache
 import asyncio
 import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.api_database import database_mtime_ns, load_api_database
 
 class LLKFunctionQuery:
     """Query LLK functions from the TT-Metal API database using simple substring search."""
@@ -21,15 +25,24 @@ class LLKFunctionQuery:
         """Initialize with database path."""
         self.database_path = Path(__file__).parent / "api_signatures_db.json" # Hard coded to be in the same directory as this file
         self.database = None
+        self._sfpi_funcs: List[Tuple[str, str, str, str]] = []  # (lowercased name, name, signature, header) of SFPI functions
         self._load_database()
     
     def _load_database(self):
         """Load the API database from JSON file."""
-        if not self.database_path.exists():
-            raise FileNotFoundError(f"Database not found at: {self.database_path}")
+        self.database = load_api_database(self.database_path)
         
-        with open(self.database_path, 'r') as f:
-            self.database = json.load(f)
+        # Only SFPI functions are ever searched, so filter them out once
+        for api_info in self.database.get("apis", {}).values():
+            # Only consider functions and template functions
+            if api_info.get("type") not in ["function", "template_function", "member_function"]:
+                continue
+            
+            header = api_info.get("header", "")
+            if self._is_sfpi_header(header):
+                # Lowercase names once here rather than on every query; many functions share a header
+                name = api_info.get("name", "")
+                self._sfpi_funcs.append((name.lower(), name, api_info.get("signature", ""), sys.intern(header)))
     
     def _is_sfpi_header(self, header_path: str) -> bool:
         """Check if a header is in the SFPI path."""
@@ -59,33 +72,29 @@ class LLKFunctionQuery:
         Search for functions by name in the database using simple substring matching.
         Returns functions grouped by header.
         """
-        # Dictionary to group functions by header
-        functions_by_header = defaultdict(list)
+        return self._search_functions_by_names([keyword])[keyword]
+    
+    def _search_functions_by_names(self, keywords: List[str]) -> Dict[str, Dict[str, List[Dict]]]:
+        """
+        Search for several keywords in one pass over the SFPI functions.
+        Returns, for each keyword, its matching functions grouped by header.
+        """
+        # Dictionary per keyword to group functions by header
+        functions_by_keyword = {keyword: defaultdict(list) for keyword in keywords}
+        needles = [(keyword.lower(), functions_by_keyword[keyword]) for keyword in functions_by_keyword]
         
-        # Search through all APIs in the database
-        for api_key, api_info in self.database.get("apis", {}).items():
-            # Only consider functions and template functions
-            if api_info.get("type") not in ["function", "template_function", "member_function"]:
-                continue
-            
-            # Get the header path
-            header = api_info.get("header", "")
-            
-            # Skip if not in SFPI path
-            if not self._is_sfpi_header(header):
-                continue
-            
-            # Get function name
-            func_name = api_info.get("name", "")
-            
-            # Simple substring search - if keyword appears anywhere in function name
-            if keyword.lower() in func_name.lower():
-                functions_by_header[header].append({
-                    "signature": api_info.get("signature", ""),
-                    "name": func_name
-                })
-        
-        return dict(functions_by_header)
+        # Search through the prefiltered SFPI functions
+        for name_lower, func_name, signature, header in self._sfpi_funcs:
+            for needle, functions_by_header in needles:
+                # Simple substring search - if keyword appears anywhere in function name
+                if needle in name_lower:
+                    functions_by_header[header].append({
+                        "signature": signature,
+                        "name": func_name
+                    })
+        
+        return {keyword: dict(functions_by_header)
+                for keyword, functions_by_header in functions_by_keyword.items()}
     
     def query(self, keyword: str) -> Dict[str, List]:
         """
@@ -101,6 +110,27 @@ class LLKFunctionQuery:
         # Search for functions - simple substring match
         functions_by_header = self._search_functions_by_name(keyword)
         
+        return self._build_result(keyword, functions_by_header)
+    
+    def query_many(self, keywords: List[str]) -> Dict[str, Dict[str, List]]:
+        """
+        Query SFPI functions for several keywords at once.
+        
+        Scans the functions once for the whole batch instead of once per keyword.
+        
+        Args:
+            keywords: The keywords to search for in function names
+            
+        Returns:
+            Dictionary mapping each keyword to the same result query() returns for it
+        """
+        matches = self._search_functions_by_names(keywords)
+        
+        return {keyword: self._build_result(keyword, functions_by_header)
+                for keyword, functions_by_header in matches.items()}
+    
+    def _build_result(self, keyword: str, functions_by_header: Dict[str, List[Dict]]) -> Dict[str, List]:
+        """Build the query result for one keyword from its matches grouped by header."""
         # Build result
         result = {
             "keyword": keyword,
@@ -123,6 +153,11 @@ class LLKFunctionQuery:
         
         return result
 
+@lru_cache(maxsize=4)
+def _get_query(database_path: str, mtime_ns: Optional[int]) -> LLKFunctionQuery:
+    """Build an LLKFunctionQuery once per database file version."""
+    return LLKFunctionQuery(database_path)
+
 async def query_llk_functions(keyword: str) -> Dict[str, List]:
     """
     Query llk functions by searching function names directly.
@@ -159,9 +194,15 @@ async def query_llk_functions(keyword: str) -> Dict[str, List]:
             ]
         }
     """
+    return query_llk_functions_sync(keyword)
+
+
+def query_llk_functions_sync(keyword: str) -> Dict[str, List]:
+    """Synchronous implementation of query_llk_functions, for use from worker threads."""
     try:
         # Create query instance
-        query_instance = LLKFunctionQuery()
+        database_path = str(Path(__file__).parent / "api_signatures_db.json")
+        query_instance = _get_query(database_path, database_mtime_ns(database_path))
         
         # Perform the query
         result = query_instance.query(keyword)
@@ -6,44 +6,168 @@ in the TT-Metal API database.
 
 import json
 import os
+import argparse
+import heapq
+import pickle
+import tempfile
+from array import array
+from collections import Counter
+import functools
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
 import sys
 import asyncio
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.api_database import database_mtime_ns, load_api_database
+
+DATABASE_PATH = Path(__file__).parent / "api_signatures_db.json"
+
+# Header path prefixes searched unless the caller passes its own
+_DEFAULT_SEARCH_PATHS = ("hw/ckernels/wormhole_b0/metal/llk_api", "hostdevcommon")
+
+# Preprocessed index of the default search paths, so the JSON database needn't be parsed at startup
+INDEX_CACHE_PATH = Path(__file__).parent / "api_signatures_db.cache.pkl"
+_INDEX_CACHE_VERSION = 2
+
+def _char_mask(text: str) -> int:
+    """Bitmask with bit ord(c) set for every character c in text."""
+    mask = 0
+    for char in set(text):
+        mask |= 1 << ord(char)
+    return mask
+
+
+def _query_masks(query: str) -> Tuple[Tuple[int, int], ...]:
+    """
+    Group the query's characters by how often they occur, as (count, mask) pairs.
+    
+    Counting the query characters found in a target is then one AND and popcount
+    per distinct count, instead of one scan of the target per query character.
+    """
+    masks: Dict[int, int] = {}
+    for char, count in Counter(query).items():
+        masks[count] = masks.get(count, 0) | (1 << ord(char))
+    return tuple(masks.items())
+
+
+try:
+    _popcount = int.bit_count  # Python 3.10+
+except AttributeError:
+    def _popcount(value: int) -> int:
+        """Number of set bits in a non-negative int."""
+        return bin(value).count('1')
+
+
+def _substring_score(query_lower: str, query_len: int, target_lower: str, target_len: int) -> Optional[float]:
+    """Score for an exact or substring match, or None if neither string contains the other."""
+    # Exact match
+    if query_lower == target_lower:
+        return 1.0
+    
+    # Query is substring of target
+    if query_lower in target_lower:
+        return 0.8 + (query_len / target_len) * 0.2
+    
+    # Target is substring of query
+    if target_lower in query_lower:
+        return 0.7 + (target_len / query_len) * 0.2
+    
+    return None
+
+
+def _overlap_score(query_len: int, query_masks: Tuple[Tuple[int, int], ...],
+                   target_len: int, target_mask: int) -> float:
+    """Score from the number of query characters that appear in the target; at most 0.5."""
+    matching = 0
+    for count, mask in query_masks:
+        matching += count * _popcount(mask & target_mask)
+    return matching / max(query_len, target_len) * 0.5
+
+
+def _score(query_lower: str, query_len: int, query_masks: Tuple[Tuple[int, int], ...],
+           target_lower: str, target_len: int, target_mask: int) -> float:
+    """Similarity score for lowercase strings whose lengths and character masks are already known."""
+    similarity = _substring_score(query_lower, query_len, target_lower, target_len)
+    if similarity is None:
+        similarity = _overlap_score(query_len, query_masks, target_len, target_mask)
+    return similarity
+
+
+def _is_default_search_paths(search_paths: Tuple[str, ...]) -> bool:
+    """Check if search_paths select the same symbols as the default search paths."""
+    return frozenset(search_paths) == frozenset(_DEFAULT_SEARCH_PATHS)
+
+
+class _SymbolIndex:
+    """
+    Named APIs in a set of search paths, as parallel lists plus lookup tables.
+    
+    Fully built before it is published, so a search that takes a reference
+    to it sees one consistent index even if search_paths changes meanwhile.
+    """
+    __slots__ = ('search_paths', 'names', 'names_lower', 'headers', 'records',
+                 'name_index', 'names_len', 'names_mask', 'header_to_include')
+    
+    def __init__(self, search_paths: Optional[Tuple[str, ...]], names: List[str], names_lower: List[str],
+                 headers: List[str], records: List[Dict], name_index: Dict[str, List[int]],
+                 header_to_include: Dict[str, str]):
+        self.search_paths = search_paths
+        self.names = names
+        self.names_lower = names_lower
+        self.headers = headers
+        self.records = records
+        self.name_index = name_index  # lowercased name -> indices, in database order
+        self.names_len = array('i', map(len, names_lower))
+        # Character bitmask of each lowercased name
+        self.names_mask = [_char_mask(name_lower) for name_lower in names_lower]
+        self.header_to_include = header_to_include  # indexed header -> include statement
+
+
 class SymbolFinder:
     """Find similar symbols in the TT-Metal API database."""
     
     def __init__(self, debug: bool = False):
         """Initialize the symbol finder."""
-        self.database_path = Path(__file__).parent / "api_signatures_db.json"
+        self.database_path = DATABASE_PATH
+        self.index_cache_path = INDEX_CACHE_PATH
         self.debug = debug
         self.database = None
         
-        # Default search paths
-        self.search_paths = [
-            "hw/ckernels/wormhole_b0/metal/llk_api",
-            "hostdevcommon"
-        ]
+        # Named APIs in the search paths, replaced whenever search_paths is set
+        self._index = _SymbolIndex(None, [], [], [], [], {}, {})
         
-        # Load database
-        self.load_database()
+        # Default search paths; setting them builds the index. The JSON database is
+        # only loaded if the on-disk index cache is missing or stale
+        self.search_paths = list(_DEFAULT_SEARCH_PATHS)
     
     def log(self, message: str):
         """Print debug message if debug is enabled."""
         if self.debug:
             print(f"[DEBUG] {message}")
     
+    @property
+    def database(self) -> Dict:
+        """The parsed API database, loaded on first use."""
+        if self._database is None:
+            self.load_database()
+        return self._database
+    
+    @database.setter
+    def database(self, database: Optional[Dict]):
+        self._database = database
+    
     def load_database(self):
         """Load the API database from JSON file."""
         self.log(f"Loading database from: {self.database_path}")
         
-        if not self.database_path.exists():
-            raise FileNotFoundError(f"Database not found at: {self.database_path}")
-        
         try:
-            with open(self.database_path, 'r') as f:
-                self.database = json.load(f)
+            self.database = load_api_database(self.database_path)
             
             self.log(f"Database loaded successfully")
             self.log(f"Total APIs: {len(self.database.get('apis', {}))}")
@@ -52,85 +176,206 @@ class SymbolFinder:
             self.log(f"Error loading database: {e}")
             raise
     
+    @property
+    def search_paths(self) -> List[str]:
+        """Header path prefixes that symbols are searched in."""
+        return self._search_paths
+    
+    @search_paths.setter
+    def search_paths(self, search_paths: List[str]):
+        self._search_paths = search_paths
+        # startswith() checks every prefix of a tuple in one C-level call
+        self._search_paths_tuple = tuple(search_paths)
+        # Filter at assignment time, so searches never check header prefixes
+        self._index_search_paths()
+    
     def is_in_search_paths(self, header_path: str) -> bool:
         """Check if a header is in one of the search paths."""
-        #print(header_path)
-        for search_path in self.search_paths:
-            if header_path.startswith(search_path):
-                return True
-        return False
+        return header_path.startswith(self._search_paths_tuple)
     
-    def calculate_similarity(self, query: str, target: str) -> float:
-        """Calculate simple similarity score between two strings."""
-        query = query.lower()
-        target = target.lower()
+    def _index_search_paths(self):
+        """
+        Index the named APIs in the current search paths as parallel lists.
+        
+        The index is rebuilt only when search_paths changes. It is built in
+        full and then published with a single assignment, so concurrent
+        searches never see a half-built index.
+        """
+        search_paths = self._search_paths_tuple
+        if search_paths == self._index.search_paths:
+            return
+        
+        try:
+            stat = os.stat(self.database_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Database not found at: {self.database_path}")
+        signature = (stat.st_mtime_ns, stat.st_size)
+        index = self._read_index_cache(signature, search_paths)
+        if index is None:
+            index = self._build_index(search_paths)
+            self._write_index_cache(signature, search_paths, index)
+        
+        # Headers repeat across many APIs; normalize each distinct one once
+        header_to_include = {header: self.normalize_include_path(header) for header in set(index[2])}
+        
+        self._index = _SymbolIndex(search_paths, *index, header_to_include)
+        self.log(f"Indexed {len(index[0])} named APIs in search paths")
+    
+    def _build_index(self, search_paths: Tuple[str, ...]) -> tuple:
+        """Build the parallel-list index of named APIs in search_paths from the database."""
+        names = []
+        names_lower = []
+        headers = []
+        records = []
+        name_index = {}
+        
+        for api_info in self.database.get('apis', {}).values():
+            header = api_info.get('header', '')
+            name = api_info.get('name', '')
+            if name and header.startswith(search_paths):
+                name_lower = name.lower()
+                name_index.setdefault(name_lower, []).append(len(names))
+                names.append(name)
+                names_lower.append(name_lower)
+                # Many APIs share a header; interning keeps one copy, which pickling preserves
+                headers.append(sys.intern(header))
+                records.append(api_info)
         
-        # Exact match
-        if query == target:
-            return 1.0
+        return names, names_lower, headers, records, name_index
+    
+    def _read_index_cache(self, signature: Tuple[int, int], search_paths: Tuple[str, ...]) -> Optional[tuple]:
+        """Load the index for search_paths from the pickle cache, if it matches the database."""
+        if not _is_default_search_paths(search_paths):
+            return None
         
-        # Query is substring of target
-        if query in target:
-            return 0.8 + (len(query) / len(target)) * 0.2
+        try:
+            with open(self.index_cache_path, 'rb') as f:
+                cache = pickle.load(f)
+            if cache['version'] != _INDEX_CACHE_VERSION or cache['signature'] != signature:
+                return None
+            index = cache['index']
+        except Exception as e:
+            # Missing, stale or unreadable: fall back to the JSON database
+            self.log(f"Index cache not used: {e}")
+            return None
         
-        # Target is substring of query
-        if target in query:
-            return 0.7 + (len(target) / len(query)) * 0.2
+        self.log(f"Loaded index from: {self.index_cache_path}")
+        return index
+    
+    def _write_index_cache(self, signature: Tuple[int, int], search_paths: Tuple[str, ...], index: tuple):
+        """
+        Save the index to the pickle cache.
         
-        # Count matching characters
-        matching = sum(1 for c in query if c in target)
-        return matching / max(len(query), len(target)) * 0.5
+        Only the default search paths are cached, so the file stays one index
+        in size however many path sets callers search.
+        """
+        if not _is_default_search_paths(search_paths):
+            return
+        
+        cache = {'version': _INDEX_CACHE_VERSION, 'signature': signature, 'index': index}
+        try:
+            # Write a unique temporary file then rename it, so readers never see a
+            # partial file and concurrent writers never share one
+            fd, tmp_path = tempfile.mkstemp(prefix=f"{self.index_cache_path.name}.",
+                                            suffix=".tmp", dir=self.index_cache_path.parent)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+                # mkstemp creates the file private to its owner; other users may share the cache
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, self.index_cache_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            # The cache is only an optimization; a read-only install still works
+            self.log(f"Could not write index cache: {e}")
+    
+    def calculate_similarity(self, query: str, target: str) -> float:
+        """Calculate simple similarity score between two strings."""
+        query = query.lower()
+        target = target.lower()
+        return _score(query, len(query), _query_masks(query), target, len(target), _char_mask(target))
     
     def find_similar_symbols(self, query: str, max_results: int = 10) -> List[Dict]:
         """Find symbols similar to the query."""
+        results = []
+        index = self._index
+        for similarity, i in self._top_matches(index, query, max_results):
+            api_info = index.records[i]
+            results.append({
+                'name': index.names[i],
+                'type': api_info.get('type', 'unknown'),
+                'signature': api_info.get('signature', ''),
+                'header': index.headers[i],
+                'similarity': similarity
+            })
+        
+        return results
+    
+    def _top_matches(self, index: _SymbolIndex, query: str, max_results: int) -> List[Tuple[float, int]]:
+        """
+        Score the symbols of an index against the query.
+        
+        Returns:
+            (similarity, index) of the best matches, best first
+        """
         self.log(f"Searching for symbols similar to: '{query}'")
         
-        results = []
-        checked_count = 0
+        # Min-heap of the best (similarity, -index) pairs seen so far; the negated
+        # index makes earlier symbols win ties, keeping database order
+        top = []
         matched_count = 0
         
-        # Get all APIs
-        apis = self.database.get('apis', {})
+        # Only named APIs in the search paths are scored
+        query_lower = query.lower()
+        query_len = len(query_lower)
+        query_masks = _query_masks(query_lower)
         
-        for api_key, api_info in apis.items():
-            # Get header path
-            header = api_info.get('header', '')
-            
-            # Check if in search paths
-            if not self.is_in_search_paths(header):
-                continue
-            
-            checked_count += 1
-            
-            # Get symbol name
-            name = api_info.get('name', '')
-            if not name:
-                continue
-            
+        # Only exact matches score 1.0, so if there are enough of them they are the answer
+        exact = index.name_index.get(query_lower, [])
+        if len(exact) >= max_results:
+            self.log(f"Found {len(exact)} exact matches, skipping the scan")
+            return [(1.0, i) for i in exact[:max(max_results, 0)]]
+        
+        # Bind everything the loop touches to locals, avoiding attribute and global lookups per symbol
+        names = index.names
+        names_len = index.names_len
+        names_mask = index.names_mask
+        substring_score = _substring_score
+        overlap_score = _overlap_score
+        heappush = heapq.heappush
+        heappushpop = heapq.heappushpop
+        debug = self.debug
+        skipped_count = 0
+        
+        for i, name_lower in enumerate(index.names_lower):
             # Calculate similarity
-            similarity = self.calculate_similarity(query, name)
+            similarity = substring_score(query_lower, query_len, name_lower, names_len[i])
+            if similarity is None:
+                # Overlap scores are at most 0.5, and a later symbol must beat the
+                # worst kept score outright, so skip them once that is out of reach
+                if len(top) >= max_results and top[0][0] >= 0.5:
+                    skipped_count += 1
+                    continue
+                similarity = overlap_score(query_len, query_masks, names_len[i], names_mask[i])
             
             if similarity > 0.3:  # Threshold
                 matched_count += 1
-                results.append({
-                    'name': name,
-                    'type': api_info.get('type', 'unknown'),
-                    'signature': api_info.get('signature', ''),
-                    'header': header,
-                    'similarity': similarity
-                })
+                # max_results is positive here; otherwise the exact-match check returned
+                if len(top) < max_results:
+                    heappush(top, (similarity, -i))
+                else:
+                    heappushpop(top, (similarity, -i))
                 
-                if self.debug and similarity > 0.7:
-                    self.log(f"High similarity match: {name} ({similarity:.3f})")
+                if debug and similarity > 0.7:
+                    self.log(f"High similarity match: {names[i]} ({similarity:.3f})")
         
-        self.log(f"Checked {checked_count} APIs in search paths")
+        self.log(f"Checked {len(names)} APIs in search paths")
         self.log(f"Found {matched_count} matches above threshold")
+        self.log(f"Skipped character overlap for {skipped_count} APIs that could not make the top results")
         
-        # Sort by similarity
-        results.sort(key=lambda x: x['similarity'], reverse=True)
-        
-        # Return top results
-        return results[:max_results]
+        return [(similarity, -neg_index) for similarity, neg_index in sorted(top, reverse=True)]
     
     def normalize_include_path(self, header_path: str) -> str:
         """Convert header path to include statement."""
@@ -152,32 +397,50 @@ class SymbolFinder:
             # Default case
             return f"#include <{header_path}>"
     
+    def _include_for(self, header_path: str) -> str:
+        """Include statement for a header, from the precomputed table when indexed."""
+        include = self._index.header_to_include.get(header_path)
+        if include is None:
+            include = self.normalize_include_path(header_path)
+        return include
+    
     def format_results(self, results: List[Dict]) -> Dict:
         """Format results for output."""
-        formatted = {
-            "results": []
+        return {
+            "results": list(self.iter_formatted_results(results))
         }
-        
+    
+    def iter_formatted_results(self, results: Iterable[Dict]) -> Iterator[Dict]:
+        """Lazily format results for output, one entry at a time."""
         for result in results:
-            formatted_entry = {
+            yield {
                 "name": result['name'],
                 "type": result['type'],
                 "signature": result['signature'],
-                "include": self.normalize_include_path(result['header']),
+                "include": self._include_for(result['header']),
                 "similarity": round(result['similarity'], 3)
             }
-            formatted['results'].append(formatted_entry)
-        
-        return formatted
+    
+    def iter_search(self, query: str, max_results: int = 10) -> Iterator[Dict]:
+        """Yield formatted results for the query, best first, straight from the index."""
+        index = self._index
+        for similarity, i in self._top_matches(index, query, max_results):
+            api_info = index.records[i]
+            yield {
+                "name": index.names[i],
+                "type": api_info.get('type', 'unknown'),
+                "signature": api_info.get('signature', ''),
+                "include": index.header_to_include[index.headers[i]],
+                "similarity": round(similarity, 3)
+            }
     
     def search(self, query: str, max_results: int = 10) -> Dict:
         """Main search method - find and format results."""
         try:
-            # Find similar symbols
-            raw_results = self.find_similar_symbols(query, max_results)
-            
-            # Format results
-            formatted = self.format_results(raw_results)
+            # Find similar symbols and format them in one pass
+            formatted = {
+                "results": list(self.iter_search(query, max_results))
+            }
             
             # Add query to output
             formatted['query'] = query
@@ -211,13 +474,41 @@ async def find_similar_symbols(
     Returns:
         Dictionary with search results
     """
+    # Scoring is CPU-bound; run it in a worker thread so the event loop stays free
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None,
+        functools.partial(find_similar_symbols_sync, incorrect_symbol, max_results, search_paths, debug)
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def _get_finder(search_paths: Optional[FrozenSet[str]], debug: bool, mtime_ns: Optional[int]) -> SymbolFinder:
+    """
+    Build a SymbolFinder once per set of search paths, debug flag and database file version.
+    
+    Path order doesn't affect which symbols match, so any ordering shares one finder.
+    """
+    finder = SymbolFinder(debug=debug)
+    
+    # Override search paths if provided; this re-indexes before the finder is shared
+    if search_paths:
+        finder.search_paths = sorted(search_paths)
+    
+    return finder
+
+
+def find_similar_symbols_sync(
+    incorrect_symbol: str,
+    max_results: int = 10,
+    search_paths: Optional[List[str]] = None,
+    debug: bool = False
+) -> Dict:
+    """Synchronous implementation of find_similar_symbols, for use from worker threads."""
     try:
-        # Create finder instance
-        finder = SymbolFinder(debug=debug)
-        
-        # Override search paths if provided
-        if search_paths:
-            finder.search_paths = search_paths
+        # Reuse the finder for these search paths
+        paths_key = frozenset(search_paths) if search_paths else None
+        finder = _get_finder(paths_key, debug, database_mtime_ns(DATABASE_PATH))
         
         # Run search
         return finder.search(incorrect_symbol, max_results)
@@ -233,52 +524,33 @@ async def find_similar_symbols(
 # Command line interface
 def main():
     """Main function for command line usage."""
+    parser = argparse.ArgumentParser(
+        description="Find symbols similar to a possibly misspelled symbol name",
+        epilog="Examples:\n"
+               "  python get_similar_symbols.py llk_math_exp\n"
+               "  python get_similar_symbols.py Buffer --debug",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
     
+    parser.add_argument("symbol", help="Symbol name to search for")
+    parser.add_argument("--debug", action="store_true", help="Enable debug output")
+    parser.add_argument("--max", type=int, default=10, dest="max_results",
+                        help="Maximum results (default: 10)")
     
-    # Check arguments
-    if len(sys.argv) < 2:
-        print("Usage: python get_similar_symbols.py <symbol> [options]")
-        print("Options:")
-        print("  --debug          Enable debug output")
-        print("  --max N          Maximum results (default: 10)")
-        print("\nExamples:")
-        print("  python get_similar_symbols.py llk_math_exp")
-        print("  python get_similar_symbols.py Buffer --debug")
-        sys.exit(1)
-    
-    # Parse arguments
-    args = sys.argv[1:]
-    debug = False
-    max_results = 10
-    symbol = None
-    
-    i = 0
-    while i < len(args):
-        if args[i] == '--debug':
-            debug = True
-        elif args[i] == '--max' and i + 1 < len(args):
-            max_results = int(args[i + 1])
-            i += 1
-        elif not args[i].startswith('--'):
-            symbol = args[i]
-        i += 1
-    
-    # Run diagnostic if requested
-    
-    # Check if symbol provided
-    if not symbol:
-        print("Error: No symbol provided")
-        sys.exit(1)
+    args = parser.parse_args()
     
     # Run search
-    print(f"Searching for symbols similar to: '{symbol}'")
-    if debug:
+    print(f"Searching for symbols similar to: '{args.symbol}'")
+    if args.debug:
         print("Debug mode enabled\n")
     
-    result = asyncio.run(find_similar_symbols(symbol, max_results, debug=debug))
+    result = find_similar_symbols_sync(args.symbol, args.max_results, debug=args.debug)
     
     # Print results
-    print(json.dumps(result, indent=2))
+    if orjson is not None:
+        print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
+    else:
+        print(json.dumps(result, indent=2))
 
 
 if __name__ == "__main__":